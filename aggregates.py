@@ -0,0 +1,93 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+import spool
+
+# Read side of the co_selections table, which spool.enqueue keeps up to date
+# with one count per (worksheet, reference, selected, other) as respondents
+# finish. Unlike answer_counts (per-click state for question selection), it
+# only counts completed, saved responses, so it matches what lands in Sheets.
+# Queries hit the table's primary key and take milliseconds, with no Sheets
+# download.
+
+def agreement_by_reference(worksheet, reference=None, path=spool.SPOOL_PATH):
+    # The inner query folds (selected, other) and (other, selected) into one
+    # row per question: x < y by name, w = how often x won, n = answers.
+    # Agreement is the chance that two different respondents shown the same
+    # question gave the same answer, so questions answered once carry no
+    # weight rather than counting as perfect agreement.
+    where = "worksheet = ?" + (" AND reference = ?" if reference is not None else "")
+    params = (worksheet,) + ((reference,) if reference is not None else ())
+    with spool.connect(path) as conn:
+        rows = conn.execute(f"""
+            SELECT reference, COUNT(*), SUM(n), SUM(w * (w - 1) + (n - w) * (n - w - 1)), SUM(n * (n - 1))
+            FROM (SELECT reference, MIN(selected, other) AS x, MAX(selected, other) AS y,
+                         SUM(CASE WHEN selected < other THEN count ELSE 0 END) AS w, SUM(count) AS n
+                  FROM co_selections WHERE {where} GROUP BY reference, x, y)
+            GROUP BY reference ORDER BY SUM(n) DESC""", params).fetchall()
+    conn.close()
+    table = pd.DataFrame(rows, columns=["reference", "questions", "answers", "agreeing", "pairs"])
+    table["agreement"] = (table["agreeing"] / table["pairs"]).where(table["pairs"] > 0)
+    return table.drop(columns=["agreeing", "pairs"])
+
+def agreement_rate(worksheet, reference, path=spool.SPOOL_PATH):
+    table = agreement_by_reference(worksheet, reference, path)
+    return None if table.empty or pd.isna(table["agreement"][0]) else float(table["agreement"][0])
+
+def win_matrix(worksheet, path=spool.SPOOL_PATH):
+    # Sparse CSR over sorted names: row i holds how often i was picked over
+    # each j, summed across references; wins[i, j] for j in
+    # indices[indptr[i]:indptr[i + 1]] is data at the same positions.
+    with spool.connect(path) as conn:
+        rows = conn.execute(
+            "SELECT selected, other, SUM(count) FROM co_selections WHERE worksheet = ? GROUP BY selected, other",
+            (worksheet,)).fetchall()
+    conn.close()
+    selected, other, wins = zip(*rows) if rows else ((), (), ())
+    names = np.array(sorted(set(selected) | set(other)), dtype=object)
+    i = np.searchsorted(names, np.array(selected, dtype=object)).astype(np.int32)
+    j = np.searchsorted(names, np.array(other, dtype=object)).astype(np.int32)
+    order = np.lexsort((j, i))
+    return {
+        "names": names,
+        "indptr": np.r_[0, np.cumsum(np.bincount(i, minlength=len(names)))],
+        "indices": j[order],
+        "data": np.array(wins, dtype=np.int64)[order],
+    }
+
+def rebuild(path=spool.SPOOL_PATH):
+    # Recounts co_selections from the spooled responses, for spools written
+    # before the table existed. One write transaction covers the delete and
+    # every recount, so readers never see a partly rebuilt table and responses
+    # spooled meanwhile wait rather than being counted twice or not at all.
+    conn = spool.connect(path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM co_selections")
+        worksheets = [w for (w,) in conn.execute("SELECT DISTINCT worksheet FROM responses")]
+        for worksheet in worksheets:
+            rows = [dict(zip(json.loads(header), json.loads(row))) for header, row in conn.execute(
+                "SELECT header, row FROM responses WHERE worksheet = ? ORDER BY id", (worksheet,))]
+            spool.count_selections(conn, rows, worksheet)
+            print(f"{worksheet}: {len(rows)} responses")
+        conn.commit()
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the response aggregates in the local spool.")
+    parser.add_argument("worksheet", nargs="?", choices=["brand", "influencer"])
+    parser.add_argument("--reference", help="print the agreement rate for one reference")
+    parser.add_argument("--rebuild", action="store_true", help="recount co_selections from the spooled responses")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild()
+    if args.worksheet and args.reference:
+        print(agreement_rate(args.worksheet, args.reference))
+    elif args.worksheet:
+        print(agreement_by_reference(args.worksheet).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Checks that every image the survey can show still resolves, so broken links
+# are dropped at load time instead of rendering as empty cards. Each URL gets
+# a HEAD (or a one-byte ranged GET where HEAD isn't allowed) over one pooled
+# aiohttp session with at most `concurrency` requests in flight. Results are
+# cached in ASSET_RESULTS and only rechecked once older than max_age; URLs
+# that are definitely gone (4xx, or a zero-byte body) go to BLOCKLIST_PATH,
+# which load_brand_data and load_influencer_data filter on.
+ASSET_RESULTS = ".asset_health.json"
+BLOCKLIST_PATH = "asset_blocklist.txt"
+CONCURRENCY = 64
+TIMEOUT = 10.0
+RETRIES = 2
+MAX_AGE = 7 * 24 * 3600
+
+def load_blocklist(path=BLOCKLIST_PATH):
+    try:
+        with open(path) as f:
+            return frozenset(line.strip() for line in f if line.strip())
+    except OSError:
+        return frozenset()
+
+def read_results(path=ASSET_RESULTS):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_results(results, path=ASSET_RESULTS):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(results, f)
+    os.replace(f"{path}.tmp", path)
+
+def is_transient(status):
+    # Network errors (0), timeouts, throttling and server errors say nothing
+    # about the asset itself: they are retried, rechecked on every run and
+    # never blocked.
+    return status == 0 or status in (408, 429) or status >= 500
+
+def is_broken(result):
+    if is_transient(result["status"]):
+        return False
+    return result["status"] >= 400 or result.get("bytes") == 0
+
+def describe(resp):
+    # A ranged GET reports the full size in Content-Range ("bytes 0-0/12345").
+    size = resp.content_length
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+        size = int(content_range.rsplit("/", 1)[1])
+    return {"status": resp.status, "bytes": size, "type": resp.content_type, "checked": time.time()}
+
+async def check_all(urls, concurrency=CONCURRENCY, timeout=TIMEOUT, retries=RETRIES):
+    import aiohttp
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(session, url):
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    async with session.head(url, allow_redirects=True) as resp:
+                        result = describe(resp)
+                    if result["status"] in (405, 501):
+                        async with session.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=True) as resp:
+                            result = describe(resp)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    result = {"status": 0, "error": type(e).__name__, "checked": time.time()}
+                if not is_transient(result["status"]) or attempt == retries:
+                    return url, result
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        return dict(await asyncio.gather(*(check(session, url) for url in urls)))
+
+def check_urls(urls, results=None, max_age=MAX_AGE, concurrency=CONCURRENCY, timeout=TIMEOUT):
+    results = read_results() if results is None else results
+    now = time.time()
+    stale = [url for url in dict.fromkeys(urls)
+             if url not in results or is_transient(results[url]["status"]) or now - results[url]["checked"] > max_age]
+    if stale:
+        results.update(asyncio.run(check_all(stale, concurrency, timeout)))
+    return results, len(stale)
+
+def referenced_urls():
+    # Every image the loaders could sample, before any blocklist filtering.
+    import brand_logic
+    import influencer_logic
+
+    brand_urls = brand_logic.read_brand_images()["Product image URL"].astype(str).tolist()
+    posts = influencer_logic.read_posts()
+    post_urls = (influencer_logic.CLOUDFRONT_PREFIX + posts["Image_file_name"].astype(str)).tolist()
+    return brand_urls + post_urls
+
+def main():
+    parser = argparse.ArgumentParser(description="HEAD every survey image and write the blocklist of broken ones.")
+    parser.add_argument("urls", nargs="*", help="URLs to check (default: every brand image and post image)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    parser.add_argument("--max-age", type=float, default=MAX_AGE / 3600, help="hours before a cached result is rechecked")
+    parser.add_argument("--results", default=ASSET_RESULTS)
+    parser.add_argument("--blocklist", default=BLOCKLIST_PATH)
+    args = parser.parse_args()
+
+    urls = args.urls or referenced_urls()
+    start = time.perf_counter()
+    results, checked = check_urls(urls, read_results(args.results), args.max_age * 3600, args.concurrency, args.timeout)
+    write_results(results, args.results)
+    elapsed = time.perf_counter() - start
+
+    referenced = [results[url] for url in dict.fromkeys(urls)]
+    broken = sorted(url for url in dict.fromkeys(urls) if is_broken(results[url]))
+    with open(args.blocklist, "w") as f:
+        f.write("".join(f"{url}\n" for url in broken))
+    sizes = sorted(r["bytes"] for r in referenced if r.get("bytes"))
+    print(f"Checked {checked} of {len(referenced)} URLs in {elapsed:.1f}s; {len(broken)} broken, "
+          f"{sum(is_transient(r['status']) for r in referenced)} unreachable")
+    if sizes:
+        print(f"Image size: median {sizes[len(sizes) // 2] / 1024:.0f} KB, "
+              f"p95 {sizes[int(len(sizes) * 0.95)] / 1024:.0f} KB, total {sum(sizes) / 2 ** 20:.0f} MB")
+    print(f"Wrote {args.blocklist}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import hashlib
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gspread
+from botocore.exceptions import ClientError
+
+# In-process stand-ins for Google Sheets, S3 and the image hosts, implementing
+# just the calls the app makes, with an optional fixed latency per call to
+# mimic the network.
+
+class FakeWorksheet:
+    def __init__(self, title, latency=0.0):
+        self.title = title
+        self.latency = latency
+        self.rows = []
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def row_values(self, row):
+        self._call()
+        return self.rows[row - 1] if len(self.rows) >= row else []
+
+    def append_row(self, values):
+        self._call()
+        self.rows.append(list(values))
+
+    def append_rows(self, values):
+        self._call()
+        self.rows.extend(list(v) for v in values)
+
+class FakeSpreadsheet:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.worksheets = {}
+        self.lock = threading.Lock()
+
+    def worksheet(self, title):
+        time.sleep(self.latency)
+        with self.lock:
+            if title not in self.worksheets:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        time.sleep(self.latency)
+        with self.lock:
+            return self.worksheets.setdefault(title, FakeWorksheet(title, self.latency))
+
+class FakeS3Client:
+    def __init__(self, objects=None, latency=0.0):
+        self.objects = dict(objects or {})
+        self.latency = latency
+        self.calls = 0
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else Body.encode()
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": Key}}, "GetObject")
+        body = self.objects[(Bucket, Key)]
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        return {"Body": io.BytesIO(body), "ETag": etag}
+
+def post_metadata_objects(keys, bucket="grafluence"):
+    return {(bucket, key): json.dumps({"key": key, "likes": i, "comments": []}).encode() for i, key in enumerate(keys)}
+
+class AssetServer:
+    # A local HTTP server standing in for CloudFront and the brand image
+    # hosts. assets maps a path to (status, size); unknown paths are 404, and
+    # paths under /nohead/ answer HEAD with 405 like some origins do.
+    def __init__(self, assets=None, latency=0.0):
+        self.assets = dict(assets or {})
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def respond(self, head):
+                server.requests += 1
+                time.sleep(server.latency)
+                status, size = server.assets.get(self.path, (404, 0))
+                if head and self.path.startswith("/nohead/"):
+                    status, size = 405, 0
+                ranged = not head and "Range" in self.headers and status == 200
+                self.send_response(206 if ranged else status)
+                self.send_header("Content-Type", "image/jpeg")
+                if ranged:
+                    self.send_header("Content-Range", f"bytes 0-0/{size}")
+                self.send_header("Content-Length", str(1 if ranged else size))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(b"\0" * (1 if ranged else size))
+
+            def do_HEAD(self):
+                self.respond(head=True)
+
+            def do_GET(self):
+                self.respond(head=False)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
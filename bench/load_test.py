@@ -0,0 +1,131 @@
+import argparse
+import os
+import pickle
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Drives testapp.py headlessly with Streamlit's AppTest: each simulated
+# respondent clicks through every phase, answering at random. --workers
+# processes run respondents at the same time, each one like a replica: its own
+# caches and Sheets flusher, sharing one spool file, so per-click SQLite
+# writes, the flusher lease and the shared answer counts all see contention.
+# (AppTest drives a process-wide Streamlit runtime, so sessions within one
+# process run one after another.) By default each respondent replays a fixed
+# ?seed; --adaptive drops it, so questions follow the live answer counts as in
+# production. Google Sheets is replaced by bench/fakes.FakeSpreadsheet, one
+# per process; the rows landed across all of them are checked at the end.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SURVEY_SPOOL_PATH", os.path.join(tempfile.mkdtemp(), "spool.db"))
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+import fakes
+import spool
+import utils
+
+QUESTION_PHASES = {"brand_q", "influencer_q"}
+
+def run_respondent(seed, timings, adaptive=False, max_steps=200):
+    rng = random.Random(seed)
+    at = AppTest.from_file(os.path.join(ROOT, "testapp.py"), default_timeout=600)
+    if not adaptive:
+        at.query_params["seed"] = str(seed)
+
+    phase, action = "title", at
+    for _ in range(max_steps):
+        start = time.perf_counter()
+        action.run()
+        timings.setdefault(phase, []).append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"respondent {seed} failed in {phase}: {at.exception[0].message}")
+        phase = at.session_state["phase"]
+        if phase == "end":
+            break
+        buttons = list(at.button)
+        action = (rng.choice(buttons) if phase in QUESTION_PHASES else buttons[0]).click()
+
+    state = at.session_state.to_dict()
+    return len(pickle.dumps({k: v for k, v in state.items() if not k.startswith("$$")}))
+
+def landed_rows(sheet):
+    # Rows below each worksheet's header, and the worksheet calls made.
+    return ({title: len(ws.rows) - 1 for title, ws in sheet.worksheets.items()},
+            sum(ws.calls for ws in sheet.worksheets.values()))
+
+def run_worker(seeds, adaptive, sheets_latency):
+    # One replica: runs its respondents in turn, then stops its flusher
+    # (releasing the lease) and reports what reached its copy of Sheets.
+    sheet = fakes.FakeSpreadsheet(latency=sheets_latency)
+    utils.open_spreadsheet = lambda: sheet
+    timings, session_bytes = {}, []
+    for seed in seeds:
+        session_bytes.append(run_respondent(seed, timings, adaptive))
+    utils.start_sheets_flusher().stop()
+    return timings, session_bytes, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, landed_rows(sheet)
+
+def percentiles(samples):
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+    return f"n={len(samples):<6} p50 {p50:8.1f} ms   p90 {p90:8.1f} ms   p99 {p99:8.1f} ms   max {max(samples) * 1000:8.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate survey respondents and report per-rerun latency.")
+    parser.add_argument("--respondents", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4, help="replica processes running respondents at once")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="don't pass ?seed, so questions follow the live answer counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sheets-latency", type=float, default=0.2, help="seconds per fake Sheets API call")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.respondents)
+    workers = min(args.workers, args.respondents)
+    timings, session_bytes, peak_rss = {}, [], []
+    landed, calls = {}, 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        for worker_timings, sizes, rss, (worker_landed, worker_calls) in pool.map(
+                run_worker, [seeds[w::workers] for w in range(workers)], [args.adaptive] * workers,
+                [args.sheets_latency] * workers):
+            for phase, samples in worker_timings.items():
+                timings.setdefault(phase, []).extend(samples)
+            session_bytes += sizes
+            peak_rss.append(rss)
+            for title, rows in worker_landed.items():
+                landed[title] = landed.get(title, 0) + rows
+            calls += worker_calls
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.respondents} respondents on {workers} replicas{' (adaptive)' if args.adaptive else ''} "
+          f"in {elapsed:.1f}s")
+    print("Per-rerun latency by phase:")
+    for phase, samples in timings.items():
+        print(f"  {phase:<18} {percentiles(samples)}")
+    everything = [s for samples in timings.values() for s in samples]
+    print(f"  {'all':<18} {percentiles(everything)}")
+    print(f"Session state: {np.mean(session_bytes) / 1024:.1f} KiB pickled per session (max {max(session_bytes) / 1024:.1f} KiB)")
+    print(f"Peak RSS per replica: {max(peak_rss) / 1024:.0f} MiB")
+
+    # Rows the replicas' flushers left behind are drained here.
+    sheet = fakes.FakeSpreadsheet()
+    flusher = spool.SheetsFlusher(lambda: sheet, path=spool.SPOOL_PATH)
+    while flusher.flush_once():
+        pass
+    drained, drain_calls = landed_rows(sheet)
+    for title, rows in drained.items():
+        landed[title] = landed.get(title, 0) + rows
+    calls += drain_calls
+    pending = spool.pending_count(spool.SPOOL_PATH)
+    print(f"Sheets: {landed} rows landed in {calls} worksheet calls; {pending} still spooled")
+    expected = {"brand": 30 * args.respondents, "influencer": 30 * args.respondents}
+    assert landed == expected, f"expected {expected} rows in Sheets, got {landed}"
+    assert pending == 0, f"{pending} rows still spooled"
+
+if __name__ == "__main__":
+    main()
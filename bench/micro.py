@@ -0,0 +1,95 @@
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Micro-benchmarks for the data and question-generation hot paths, plus the
+# S3, Sheets and asset-check layers against the local fakes in bench/fakes.py.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+# Sessions below take the adaptive path, which reads answer counts from the
+# spool; keep that off the repo's real spool.
+os.environ.setdefault("SURVEY_SPOOL_PATH", os.path.join(tempfile.mkdtemp(), "spool.db"))
+
+import numpy as np
+import asset_check
+import brand_logic
+import fakes
+import influencer_logic
+import ingest
+import spool
+
+def bench(label, func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    unit, scale = ("ms", 1e3) if median >= 1e-3 else ("us", 1e6)
+    print(f"{label:<44} median {median * scale:9.1f} {unit}   min {min(samples) * scale:9.1f} {unit}   (n={repeat})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the survey's data paths.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--s3-latency", type=float, default=0.02, help="seconds per fake S3 or image host call")
+    args = parser.parse_args()
+    repeat = args.repeat
+    rng = np.random.default_rng(0)
+
+    print("Data loading (cache cleared before each run)")
+    bench("load_brand_data", brand_logic.load_brand_data, max(1, repeat // 5), brand_logic.load_brand_data.clear)
+    bench("load_influencer_data", influencer_logic.load_influencer_data, max(1, repeat // 5),
+          influencer_logic.load_influencer_data.clear)
+    bench("build_brand_bank (n=6000)", lambda: brand_logic.build_brand_bank(rng), max(1, repeat // 5))
+    bench("build_influencer_bank (n=6000)", lambda: influencer_logic.build_influencer_bank(rng), max(1, repeat // 5))
+
+    print("Per session")
+    seeds = iter(range(10 ** 9))
+    bench("generate_all_questions", lambda: brand_logic.generate_all_questions(next(seeds)), repeat * 10)
+    bench("generate_questions", lambda: influencer_logic.generate_questions(next(seeds)), repeat * 10)
+    bench("select_posts x 30", lambda: [influencer_logic.select_posts(q) for q in range(30)], repeat)
+
+    print("Per question")
+    names = influencer_logic.load_influencer_data()[2]
+    bench("get_influencer_info", lambda: influencer_logic.get_influencer_info(names[rng.integers(len(names))]), repeat * 50)
+    bench("get_brand_question", lambda: brand_logic.get_brand_question(int(rng.integers(1000))), repeat * 50)
+    bench("render_brand_question (uncached)", lambda: brand_logic.render_brand_question.__wrapped__(int(rng.integers(1000))), repeat * 10)
+    bench("render_influencer_question (uncached)", lambda: influencer_logic.render_influencer_question.__wrapped__(
+        q := int(rng.integers(1000)), tuple(map(tuple, influencer_logic.select_posts(q).tolist()))), repeat * 10)
+
+    print("S3 (fake client)")
+    keys = [f"{i}.json" for i in range(200)]
+    client = fakes.FakeS3Client(fakes.post_metadata_objects(keys), latency=args.s3_latency)
+    cache_dir = tempfile.mkdtemp()
+    ingest.S3_CACHE_DIR = cache_dir
+    clear_cache = lambda: shutil.rmtree(cache_dir, ignore_errors=True)
+    bench("s3_fetch_file x 200, sequential, cold", lambda: [ingest.s3_fetch_file(k, client=client) for k in keys], 2, clear_cache)
+    bench("fetch_many x 200, cold", lambda: ingest.fetch_many(keys, client=client), 3, clear_cache)
+    bench("fetch_many x 200, revalidated", lambda: ingest.fetch_many(keys, client=client), 3)
+    bench("fetch_many x 200, cached", lambda: ingest.fetch_many(keys, client=client, revalidate=False), 3)
+
+    print("Sheets (fake spreadsheet)")
+    path = os.path.join(cache_dir, "spool.db")
+    rows = [{"question": q + 1, "reference": "A", "selected": "B", "other": "C"} for q in range(30)]
+    bench("spool.enqueue (one respondent)", lambda: spool.enqueue(rows, "brand", path), repeat * 5)
+    flusher = spool.SheetsFlusher(fakes.FakeSpreadsheet, path=path)
+    bench("SheetsFlusher.flush_once (500 rows)", flusher.flush_once, 3)
+
+    print("Asset check (local HTTP server)")
+    server = fakes.AssetServer({f"/img/{i}.jpg": (200, 1024) for i in range(1000)}, latency=args.s3_latency)
+    urls = [f"{server.url}/img/{i}.jpg" for i in range(1000)]
+    bench("check_urls x 1000, cold", lambda: asset_check.check_urls(urls, {}), 3)
+    results = asset_check.check_urls(urls, {})[0]
+    bench("check_urls x 1000, cached", lambda: asset_check.check_urls(urls, results), 3)
+    server.close()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
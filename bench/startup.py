@@ -0,0 +1,50 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-start benchmark: every measurement runs in a fresh interpreter so
+# nothing is shared through sys.modules or Streamlit's caches.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+"""
+
+RENDER_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+t = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=600).run()
+title = time.perf_counter() - t
+at.button[0].click().run()
+t = time.perf_counter()
+at.button[0].click().run()
+print(title, time.perf_counter() - t)
+"""
+
+def run(snippet):
+    out = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [float(x) for x in out.stdout.split()]
+
+def report(label, samples):
+    print(f"{label:<40} median {statistics.median(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and first-render latency of the survey app.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for module in ["utils", "brand_logic", "influencer_logic"]:
+        report(f"import {module}", [run(IMPORT_SNIPPET.format(module=module))[0] for _ in range(args.repeat)])
+
+    renders = [run(RENDER_SNIPPET.format(app=os.path.join(ROOT, "testapp.py"))) for _ in range(args.repeat)]
+    report("first render: title page", [r[0] for r in renders])
+    report("first render: brand question 1", [r[1] for r in renders])
+
+if __name__ == "__main__":
+    main()
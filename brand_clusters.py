@@ -0,0 +1,120 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import asset_check
+import snapshot
+
+# Groups brands by price level and product mix, so cluster questions cover
+# every brand in the data instead of a hand-kept list. Each brand's features
+# are its standardised log average price and the share of its images in each
+# Category 2; brands are clustered with k-means (k-means++ seeding, a few
+# restarts) and labelled 1..k from cheapest to most expensive cluster. The
+# assignment is cached next to the dataset snapshot and rebuilt when the
+# workbook, the clustering settings or the image blocklist change.
+DATA_FILE = "grafluence_data.xlsx"
+CLUSTERS_K = 7
+PRICE_WEIGHT = 0.5
+SEED = 0
+
+def brand_features(brands, price_lookup, images):
+    shares = pd.crosstab(images["Brand"], images["Category 2"].fillna("OTHER"), normalize="index")
+    shares = shares.reindex(brands, fill_value=0).to_numpy()
+    price = np.log(pd.Series(price_lookup).reindex(brands).to_numpy(dtype=float))
+    price = (price - price.mean()) / (price.std() or 1)
+    return np.column_stack([PRICE_WEIGHT * price, shares])
+
+def kmeans_pp(X, k, rng):
+    # Each new centre is drawn with probability proportional to its squared
+    # distance from the nearest centre chosen so far.
+    centers = np.empty((k, X.shape[1]))
+    centers[0] = X[rng.integers(len(X))]
+    d2 = ((X - centers[0]) ** 2).sum(1)
+    for c in range(1, k):
+        total = d2.sum()
+        centers[c] = X[rng.choice(len(X), p=d2 / total) if total > 0 else rng.integers(len(X))]
+        d2 = np.minimum(d2, ((X - centers[c]) ** 2).sum(1))
+    return centers
+
+def kmeans(X, k, rng, n_init=10, max_iter=100, tol=1e-9):
+    sq = (X ** 2).sum(1)
+    best = (np.inf, None, None)
+    for _ in range(n_init):
+        centers = kmeans_pp(X, k, rng)
+        for _ in range(max_iter):
+            d = sq[:, None] - 2 * X @ centers.T + (centers ** 2).sum(1)
+            labels = d.argmin(1)
+            onehot = labels[:, None] == np.arange(k)
+            counts = onehot.sum(0)
+            new = (onehot.T @ X) / np.maximum(counts, 1)[:, None]
+            # An emptied cluster restarts at the point worst served by its centre.
+            for c in np.flatnonzero(counts == 0):
+                far = d[np.arange(len(X)), labels].argmax()
+                new[c] = X[far]
+                d[far] = 0
+            shift = ((new - centers) ** 2).sum()
+            centers = new
+            if shift <= tol:
+                break
+        d = sq[:, None] - 2 * X @ centers.T + (centers ** 2).sum(1)
+        labels = d.argmin(1)
+        inertia = np.maximum(d[np.arange(len(X)), labels], 0).sum()
+        if inertia < best[0]:
+            best = (inertia, labels, centers)
+    return best
+
+def cluster_brands(brands, price_lookup, images, k=CLUSTERS_K, seed=SEED):
+    X = brand_features(brands, price_lookup, images)
+    k = min(k, len(brands))
+    _, labels, centers = kmeans(X, k, np.random.default_rng(seed))
+    rank = np.empty(k, dtype=int)
+    rank[np.argsort(centers[:, 0], kind="stable")] = np.arange(1, k + 1)
+    return rank[labels]
+
+def cache_key(k, seed):
+    # Everything besides the workbook that changes the features or the fit.
+    blocklist = "\n".join(sorted(asset_check.load_blocklist())).encode()
+    return {"k": k, "seed": seed, "price_weight": PRICE_WEIGHT, "blocklist": hashlib.sha256(blocklist).hexdigest()}
+
+def load_clusters(brands, price_lookup, images, k=CLUSTERS_K, seed=SEED, snapshot_dir=snapshot.SNAPSHOT_DIR):
+    key = cache_key(k, seed)
+    entry = snapshot.fresh_entry("brand_clusters", DATA_FILE, snapshot_dir)
+    if entry and all(entry.get(name) == value for name, value in key.items()):
+        cached = snapshot.read_table("brand_clusters", snapshot_dir).to_pandas()
+        lookup = dict(zip(cached["Brand"], cached["cluster"]))
+        if all(b in lookup for b in brands):
+            return np.array([lookup[b] for b in brands])
+
+    labels = cluster_brands(brands, price_lookup, images, k, seed)
+    if os.path.isdir(snapshot_dir):
+        snapshot.write_table(pd.DataFrame({"Brand": list(brands), "cluster": labels}), "brand_clusters", snapshot_dir)
+        manifest = snapshot.read_manifest(snapshot_dir)
+        manifest["brand_clusters"] = snapshot.source_entry(DATA_FILE, **key)
+        snapshot.write_manifest(manifest, snapshot_dir)
+    return labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster brands by price and product mix.")
+    parser.add_argument("--k", type=int, nargs="+", default=[CLUSTERS_K],
+                        help="one or more cluster counts; with several, print the inertia of each to help pick k")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    import brand_logic
+
+    available_brands, price_lookup, _, _ = brand_logic.load_brand_data()
+    images = brand_logic.read_brand_images()
+    X = brand_features(available_brands, price_lookup, images)
+    for k in args.k:
+        inertia, _, _ = kmeans(X, min(k, len(available_brands)), np.random.default_rng(args.seed))
+        print(f"k={k}: inertia {inertia:.4f}")
+    if len(args.k) == 1:
+        labels = load_clusters(available_brands, price_lookup, images, args.k[0], args.seed)
+        for c in np.unique(labels):
+            members = [b for b, label in zip(available_brands, labels) if label == c]
+            prices = [price_lookup[b] for b in members]
+            print(f"{c}: ${min(prices):.0f}-${max(prices):.0f}  {', '.join(members)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,206 @@
 import streamlit as st
-import pandas as pd
-import random
-from collections import Counter
-
-BRAND_CLUSTERS = {
-    "GUCCI": 1, "SAINT LAURENT": 1, "ALEXANDER MCQUEEN": 1, "TOM FORD": 1, "MAISON MARGIELA": 1, "RICK OWENS": 1, "YOHJI YAMAMOTO": 1,
-    "OFF-WHITE": 2, "SUPREME": 2, "PALM ANGELS": 2, "FEAR OF GOD": 2,
-    "THE FRANKIE SHOP": 3, "A.P.C.": 3, "VINCE": 3, "NANUSHKA": 3, "RAG & BONE": 3, "POLO RALPH LAUREN": 3,
-    "NIKE": 4, "ADIDAS": 4, "THE NORTH FACE": 4, "LULULEMON": 4,
-    "LEVI'S": 5, "AGOLDE": 5, "7 FOR ALL MANKIND": 5, "CALVIN KLEIN JEANS": 5,
-    "ZIMMERMANN": 6, "JOHANNA ORTIZ": 6, "SOLID & STRIPED": 6, "HUNZA G": 6,
-    "MICHAEL KORS COLLECTION": 7, "VERSACE JEANS COUTURE": 7, "CALVIN KLEIN JEANS": 7, "POLO RALPH LAUREN": 7
-}
-
-@st.cache_data
+import numpy as np
+from functools import lru_cache
+import asset_check
+import brand_clusters
+import metrics
+import question_bank
+import snapshot
+import thumbnails
+from utils import preload_images_html
+
+HTML_CACHE_SIZE = 2048
+
+# cache_resource rather than cache_data: every session shares one copy of the
+# lookups instead of unpickling its own on each call.
+@st.cache_resource
+@metrics.timed("load_brand_data")
 def load_brand_data():
-    prices = pd.read_excel("grafluence_data.xlsx", sheet_name="small_sample_prices")
-    images = pd.read_excel("grafluence_data.xlsx", sheet_name="brand_images_real")
+    prices = snapshot.read_excel("grafluence_data.xlsx", sheet_name="small_sample_prices")
     prices["Brand"] = prices["Brand"].str.upper()
-    images["Brand"] = images["Brand"].str.upper()
-    images = images.dropna(subset=["Product image URL"])
-
-    weighted_lookup = {}
-    for brand, group in images.groupby("Brand"):
-        weights = group["Category 2"].value_counts().to_dict()
-        weighted_lookup[brand] = list(zip(group["Product image URL"], group["Category 2"].map(weights)))
+    images = read_brand_images()
+    blocklist = asset_check.load_blocklist()
+    if blocklist:
+        images = images[~images["Product image URL"].isin(blocklist)]
+
+    # Each image is weighted by how common its Category 2 is within the brand.
+    images = images.sort_values("Brand", kind="stable")
+    weights = images.groupby(["Brand", "Category 2"], dropna=False)["Brand"].transform("size").to_numpy(dtype=float)
+    urls = images["Product image URL"].to_numpy(dtype=object)
+    brand_names = images["Brand"].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, brand_names[1:] != brand_names[:-1]])
+    stops = np.r_[starts[1:], len(brand_names)]
+    weighted_lookup = {
+        brand_names[start]: (urls[start:stop], weights[start:stop], *build_alias(weights[start:stop]))
+        for start, stop in zip(starts, stops)
+    }
 
     price_lookup = dict(zip(prices["Brand"], prices["Average Price"]))
-    available_brands = list(set(price_lookup) & set(weighted_lookup))
-    return available_brands, price_lookup, weighted_lookup
-
-brands, price_lookup, image_lookup = load_brand_data()
+    available_brands = sorted(set(price_lookup) & set(weighted_lookup))
+    labels = brand_clusters.load_clusters(available_brands, price_lookup, images)
+    return available_brands, price_lookup, weighted_lookup, build_cluster_index(labels)
 
-def weighted_sample(images, k=6):
-    urls, weights = zip(*images)
-    return random.choices(urls, weights=weights, k=min(k, len(urls)))
-
-def get_brand_data(brand):
-    images = weighted_sample(image_lookup[brand])
+def read_brand_images():
+    images = snapshot.read_excel("grafluence_data.xlsx", sheet_name="brand_images_real")
+    images["Brand"] = images["Brand"].str.upper()
+    return images.dropna(subset=["Product image URL"])
+
+def build_alias(weights):
+    # Vose's alias method: O(n) to build, O(1) per weighted draw.
+    n = len(weights)
+    scaled = weights * n / weights.sum()
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = list(np.flatnonzero(scaled < 1))
+    large = list(np.flatnonzero(scaled >= 1))
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+    return prob, alias
+
+def build_cluster_index(labels):
+    # CSR layout over brand ids (positions in available_brands): the members
+    # of cluster c are members[offsets[c]:offsets[c] + counts[c]]. Label 0
+    # leaves a brand out of cluster questions.
+    labels = np.asarray(labels)
+    clusters, codes = np.unique(labels[labels > 0], return_inverse=True)
+    members = np.flatnonzero(labels > 0)[np.argsort(codes, kind="stable")]
+    counts = np.bincount(codes, minlength=len(clusters))
+    offsets = np.r_[0, np.cumsum(counts)[:-1]]
+    return {"clusters": clusters, "offsets": offsets, "counts": counts, "members": members}
+
+def alias_draw(prob, alias, k, rng):
+    i = rng.integers(len(prob), size=k)
+    return np.where(rng.random(k) < prob[i], i, alias[i])
+
+def weighted_sample(images, k=6, rng=None, distinct=False):
+    urls, weights, prob, alias = images
+    rng = rng or np.random.default_rng()
+    if not distinct:
+        return urls[alias_draw(prob, alias, min(k, len(urls)), rng)].tolist()
+    if k >= len(urls):
+        return urls[rng.permutation(len(urls))].tolist()
+
+    # Without replacement: keep drawing from the alias table and drop repeats,
+    # which takes a couple of rounds unless a few images hold most of the
+    # weight; in that case finish with an O(n) weighted shuffle.
+    picks = []
+    for _ in range(4):
+        picks = list(dict.fromkeys(picks + alias_draw(prob, alias, 2 * k, rng).tolist()))
+        if len(picks) >= k:
+            return urls[picks[:k]].tolist()
+    keys = np.log(rng.random(len(urls))) / weights
+    return urls[np.argpartition(-keys, k - 1)[:k]].tolist()
+
+def get_brand_data(brand, rng=None):
+    _, price_lookup, image_lookup, _ = load_brand_data()
+    images = weighted_sample(image_lookup[brand], rng=rng, distinct=True)
     return {
         "Brand": brand,
         "Price": round(price_lookup[brand]),
-        "Images": images
+        "Images": [thumbnails.thumbnail_url(url) for url in images]
     }
 
-def generate_cluster_question(verify_cluster, test_cluster):
-    reference = random.choice([b for b in brands if BRAND_CLUSTERS.get(b) == verify_cluster])
-    same = random.choice([b for b in brands if BRAND_CLUSTERS.get(b) == verify_cluster and b != reference])
-    different = random.choice([b for b in brands if BRAND_CLUSTERS.get(b) == test_cluster])
-    if random.random() < 0.5:
-        return {"reference": get_brand_data(reference), "a": get_brand_data(same), "b": get_brand_data(different)}
-    else:
-        return {"reference": get_brand_data(reference), "a": get_brand_data(different), "b": get_brand_data(same)}
-
-def generate_mixed_cluster_question():
-    clusters = list(set(BRAND_CLUSTERS.values()))
-    selected_clusters = random.sample(clusters, 3)
-    selected_brands = [random.choice([b for b in brands if BRAND_CLUSTERS.get(b) == c]) for c in selected_clusters]
-    random.shuffle(selected_brands)
+def draw_cluster_triplets(n_unique, n_repeat, rng):
+    cluster_index = load_brand_data()[3]
+    offsets, counts, members = cluster_index["offsets"], cluster_index["counts"], cluster_index["members"]
+    verify = np.flatnonzero(counts >= 2)
+    pairs = np.array([(v, t) for v in verify for t in range(len(counts)) if v != t])
+    picks = np.r_[rng.choice(len(pairs), n_unique, replace=False), rng.integers(len(pairs), size=n_repeat)]
+    v, t = pairs[picks].T
+
+    # Reference and "same" are two distinct members of cluster v: draw the
+    # second from size - 1 slots and shift past the first, so no retry loop.
+    i = rng.integers(counts[v])
+    j = rng.integers(counts[v] - 1)
+    j += j >= i
+    reference = members[offsets[v] + i]
+    same = members[offsets[v] + j]
+    different = members[offsets[t] + rng.integers(counts[t])]
+
+    swap = rng.random(len(picks)) < 0.5
+    return np.column_stack([reference, np.where(swap, different, same), np.where(swap, same, different)])
+
+def draw_mixed_triplets(n, rng):
+    cluster_index = load_brand_data()[3]
+    offsets, counts, members = cluster_index["offsets"], cluster_index["counts"], cluster_index["members"]
+    # Three distinct clusters per row, already in random order, one brand each.
+    chosen = np.argsort(rng.random((n, len(counts))), axis=1)[:, :3]
+    return members[offsets[chosen] + rng.integers(counts[chosen])]
+
+@metrics.timed("build_brand_bank")
+def build_brand_bank(rng, n=6000):
+    n_mixed = n // 3
+    paired = question_bank.balanced_pick(draw_cluster_triplets(0, question_bank.POOL_FACTOR * (n - n_mixed), rng), n - n_mixed, rng)
+    mixed = question_bank.balanced_pick(draw_mixed_triplets(question_bank.POOL_FACTOR * n_mixed, rng), n_mixed, rng)
+    return question_bank.make_bank(paired, mixed)
+
+def load_brand_bank():
+    return question_bank.load_bank("brand", load_brand_data()[0], build_brand_bank)
+
+@metrics.timed("generate_all_questions")
+def generate_all_questions(seed, adaptive=True):
+    bank = load_brand_bank()
+    gains = question_bank.load_gains("brand", bank, load_brand_data()[0]) if adaptive else None
+    return question_bank.draw_session(bank, seed, gains)
+
+def get_brand_question(question_id):
+    # Image draws are seeded by the bank row, so a question renders the same
+    # thumbnails on every rerun without keeping them in session state.
+    _, reference, a, b = load_brand_bank()[question_id].tolist()
+    brands = load_brand_data()[0]
+    rng = np.random.default_rng(question_id)
     return {
-        "reference": get_brand_data(selected_brands[0]),
-        "a": get_brand_data(selected_brands[1]),
-        "b": get_brand_data(selected_brands[2])
+        "reference": get_brand_data(brands[reference], rng),
+        "a": get_brand_data(brands[a], rng),
+        "b": get_brand_data(brands[b], rng)
     }
 
-def generate_all_questions():
-    questions = []
-    clusters = list(set(BRAND_CLUSTERS.values()))
-    cluster_pairs = random.sample([(v, t) for v in clusters for t in clusters if v != t], 4)
-    cluster_pairs += random.choices([(v, t) for v in clusters for t in clusters if v != t], k=16)
-    for v, t in cluster_pairs:
-        questions.append(generate_cluster_question(v, t))
-    for _ in range(10):
-        questions.append(generate_mixed_cluster_question())
-    return questions
-
+@lru_cache(maxsize=HTML_CACHE_SIZE)
+@metrics.timed("render_brand_question")
+def render_brand_question(question_id):
+    # The HTML depends only on the bank row, so it is built once per process
+    # and shared by every session and rerun that shows this question.
+    q = get_brand_question(question_id)
+    ref_imgs = "".join([f"<img src='{url}' width='80' style='margin: 4px; border-radius: 6px;'/>" for url in q['reference']['Images']])
+    html = {"reference": f"""
+    <div style='text-align: center;'>
+        <h3>Reference Brand: {q['reference']['Brand']}</h3>
+        <p><strong>Median Price:</strong> ${q['reference']['Price']}</p>
+        {ref_imgs}
+    </div>""", "prompt": f"<h4 style='text-align:center;'>Which brand is more similar to {q['reference']['Brand']}?</h4>"}
+    for key in ['a', 'b']:
+        imgs = "".join([f"<img src='{url}' width='90' style='margin:4px; border-radius:6px;'/>" for url in q[key]['Images']])
+        html[key] = f"""
+            <div style='display: flex; flex-direction: column; justify-content: space-between; height: 300px; padding: 16px; border: 2px solid #ccc; border-radius: 12px; text-align: center;'>
+                <div>
+                    <h4>{q[key]['Brand']}</h4>
+                    <p><strong>Median Price:</strong> ${q[key]['Price']}</p>
+                    {imgs}
+                </div>
+            </div>"""
+    html["preload"] = preload_images_html([url for key in ['reference', 'a', 'b'] for url in q[key]['Images']])
+    brands = {key: q[key]['Brand'] for key in ['reference', 'a', 'b']}
+    return brands, html
+
+def record_brand_answer(i, brands, selected, other):
+    st.session_state.brand_responses.append({
+        "question": i + 1,
+        "reference": brands["reference"],
+        "selected": brands[selected],
+        "other": brands[other]
+    })
+    question_bank.record_answer("brand", (brands["reference"], brands["a"], brands["b"]), selected == "a")
+    st.session_state.brand_index += 1
+
+@metrics.timed("run_brand_survey")
 def run_brand_survey():
     if "brand_questions" not in st.session_state:
-        st.session_state.brand_questions = generate_all_questions()
+        st.session_state.brand_seed = question_bank.new_session_seed()
+        st.session_state.brand_questions = generate_all_questions(
+            st.session_state.brand_seed, adaptive=not question_bank.is_replay())
         st.session_state.brand_index = 0
         st.session_state.brand_responses = []
 
@@ -85,54 +208,27 @@ def run_brand_survey():
     if i >= 30:
         return True
 
-    q = st.session_state.brand_questions[i]
+    brands, html = render_brand_question(int(st.session_state.brand_questions[i]))
     st.markdown(f"<h3 style='text-align:center;'>Brand Question {i + 1} of 30</h3>", unsafe_allow_html=True)
 
     st.markdown("---")
-    ref_imgs = "".join([f"<img src='{url}' width='80' style='margin: 4px; border-radius: 6px;'/>" for url in q['reference']['Images']])
-    st.markdown(f"""
-    <div style='text-align: center;'>
-        <h3>Reference Brand: {q['reference']['Brand']}</h3>
-        <p><strong>Median Price:</strong> ${q['reference']['Price']}</p>
-        {ref_imgs}
-    </div>""", unsafe_allow_html=True)
+    st.markdown(html["reference"], unsafe_allow_html=True)
     st.markdown("---")
-    st.markdown(f"<h4 style='text-align:center;'>Which brand is more similar to {q['reference']['Brand']}?</h4>", unsafe_allow_html=True)
+    st.markdown(html["prompt"], unsafe_allow_html=True)
 
     col1, col2 = st.columns(2)
     for col, key in zip([col1, col2], ['a', 'b']):
         with col:
-            imgs = "".join([f"<img src='{url}' width='90' style='margin:4px; border-radius:6px;'/>" for url in q[key]['Images']])
-            st.markdown(f"""
-            <div style='display: flex; flex-direction: column; justify-content: space-between; height: 300px; padding: 16px; border: 2px solid #ccc; border-radius: 12px; text-align: center;'>
-                <div>
-                    <h4>{q[key]['Brand']}</h4>
-                    <p><strong>Median Price:</strong> ${q[key]['Price']}</p>
-                    {imgs}
-                </div>
-            </div>""", unsafe_allow_html=True)
+            st.markdown(html[key], unsafe_allow_html=True)
 
-    # Button row (aligned with respective brand)
+    # Button row (aligned with respective brand). Answers are recorded in
+    # on_click callbacks, which run before the (fragment) rerun that follows
+    # the click, so the next question renders without an extra st.rerun().
     col1b, col2b = st.columns(2)
-    if col1b.button(f"Select {q['a']['Brand']}", key=f"a_{i}"):
-        st.session_state.brand_responses.append({
-            "question": i + 1,
-            "reference": q["reference"]["Brand"],
-            "selected": q["a"]["Brand"],
-            "other": q["b"]["Brand"]
-        })
-        st.session_state.brand_index += 1
-        st.rerun()
-
-    if col2b.button(f"Select {q['b']['Brand']}", key=f"b_{i}"):
-        st.session_state.brand_responses.append({
-            "question": i + 1,
-            "reference": q["reference"]["Brand"],
-            "selected": q["b"]["Brand"],
-            "other": q["a"]["Brand"]
-        })
-        st.session_state.brand_index += 1
-        st.rerun()
+    col1b.button(f"Select {brands['a']}", key=f"a_{i}", on_click=record_brand_answer, args=(i, brands, "a", "b"))
+    col2b.button(f"Select {brands['b']}", key=f"b_{i}", on_click=record_brand_answer, args=(i, brands, "b", "a"))
 
-    return False
+    if i + 1 < 30:
+        st.markdown(render_brand_question(int(st.session_state.brand_questions[i + 1]))[1]["preload"], unsafe_allow_html=True)
 
+    return False
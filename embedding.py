@@ -0,0 +1,179 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import spool
+
+# Learns brand / influencer embeddings from the survey's triplet answers with
+# t-STE (van der Maaten & Weinberger, 2012): for a response row (reference,
+# selected, other), the reference should sit closer to the selected item than
+# to the other. Training is mini-batched NumPy with Adagrad, so millions of
+# triplets fit on one CPU box, and partial_fit warm-starts from the current
+# embedding when new responses arrive instead of refitting from scratch.
+
+class TripletEmbedding:
+    def __init__(self, dim=2, alpha=None, lr=0.1, l2=1e-4, batch_size=65536, seed=0):
+        self.dim = dim
+        self.alpha = alpha if alpha is not None else max(dim - 1, 1)
+        self.lr = lr
+        self.l2 = l2
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.names = []
+        self.ids = {}
+        self.X = np.zeros((0, dim))
+        self.G = np.zeros((0, dim))
+        self.triplets = np.zeros((0, 3), dtype=np.int32)
+        # Where the training responses came from ("spool" or "csv") and how far
+        # into it the model has read: the last spool response id, or the
+        # number of CSV rows.
+        self.source = None
+        self.position = 0
+
+    def encode(self, rows):
+        # Map response rows to id triplets, growing the vocabulary (and the
+        # embedding, with small random positions) for names not seen before.
+        names = [(r["reference"], r["selected"], r["other"]) for r in rows]
+        for name in {n for triplet in names for n in triplet} - self.ids.keys():
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        grow = len(self.names) - len(self.X)
+        if grow:
+            self.X = np.vstack([self.X, self.rng.normal(scale=1e-2, size=(grow, self.dim))])
+            self.G = np.vstack([self.G, np.zeros((grow, self.dim))])
+        return np.array([[self.ids[n] for n in triplet] for triplet in names], dtype=np.int32).reshape(-1, 3)
+
+    def loss_and_grad(self, batch):
+        i, j, k = batch.T
+        xij = self.X[i] - self.X[j]
+        xik = self.X[i] - self.X[k]
+        a = 1 + (xij ** 2).sum(1) / self.alpha
+        b = 1 + (xik ** 2).sum(1) / self.alpha
+        e = (self.alpha + 1) / 2
+        # p = a^-e / (a^-e + b^-e), computed stably from the log ratio.
+        p = 1 / (1 + np.exp(e * (np.log(a) - np.log(b))))
+        g_ij = (e / (self.alpha * a) * (1 - p))[:, None] * 2 * xij
+        g_ik = (-e / (self.alpha * b) * (1 - p))[:, None] * 2 * xik
+
+        # Scatter-add per-triplet gradients onto items, one bincount per dim.
+        idx = np.concatenate([i, j, k])
+        rows = np.concatenate([g_ij + g_ik, -g_ij, -g_ik])
+        grad = np.column_stack([np.bincount(idx, weights=rows[:, d], minlength=len(self.X)) for d in range(self.dim)])
+        grad = grad / len(batch) + self.l2 * self.X
+        return -np.log(np.maximum(p, 1e-12)).mean(), grad
+
+    def step(self, batch):
+        loss, grad = self.loss_and_grad(batch)
+        self.G += grad ** 2
+        self.X -= self.lr * grad / (np.sqrt(self.G) + 1e-8)
+        return loss
+
+    def run_epochs(self, triplets, epochs):
+        loss = np.nan
+        for _ in range(epochs):
+            order = self.rng.permutation(len(triplets))
+            losses = [self.step(triplets[order[s:s + self.batch_size]]) for s in range(0, len(order), self.batch_size)]
+            loss = float(np.mean(losses)) if losses else loss
+        return loss
+
+    def fit(self, rows, epochs=200):
+        self.triplets = np.vstack([self.triplets, self.encode(rows)])
+        return self.run_epochs(self.triplets, epochs)
+
+    def partial_fit(self, rows, epochs=20, replay=4):
+        # Train on the new triplets mixed with a replay sample of up to
+        # replay x as many old ones, so the embedding adapts to new answers
+        # without forgetting what earlier respondents said.
+        new = self.encode(rows)
+        old = self.triplets
+        self.triplets = np.vstack([old, new])
+        if len(old):
+            new = np.vstack([new, old[self.rng.integers(len(old), size=min(len(old), replay * len(new)))]])
+        return self.run_epochs(new, epochs)
+
+    def accuracy(self, triplets=None):
+        triplets = self.triplets if triplets is None else triplets
+        i, j, k = triplets.T
+        return float(np.mean(((self.X[i] - self.X[j]) ** 2).sum(1) < ((self.X[i] - self.X[k]) ** 2).sum(1)))
+
+    def neighbours(self, k=10, block=4096):
+        # Squared distances computed a block of rows at a time, so the table
+        # for thousands of items never needs the full n x n matrix at once.
+        k = min(k, len(self.X) - 1)
+        sq = (self.X ** 2).sum(1)
+        records = []
+        for start in range(0, len(self.X), block):
+            rows = slice(start, start + block)
+            d = sq[rows, None] - 2 * self.X[rows] @ self.X.T + sq[None, :]
+            d[np.arange(d.shape[0]), np.arange(start, start + d.shape[0])] = np.inf
+            nearest = np.argpartition(d, k - 1, axis=1)[:, :k]
+            nearest = np.take_along_axis(nearest, np.argsort(np.take_along_axis(d, nearest, 1), axis=1), 1)
+            for offset, neighbours in enumerate(nearest):
+                item = start + offset
+                records += [(self.names[item], rank + 1, self.names[n], float(np.sqrt(max(d[offset, n], 0))))
+                            for rank, n in enumerate(neighbours)]
+        return pd.DataFrame(records, columns=["item", "rank", "neighbour", "distance"])
+
+    def save(self, path):
+        np.savez(path, names=np.array(self.names, dtype=object), X=self.X, G=self.G, triplets=self.triplets,
+                 config=np.array([self.dim, self.alpha, self.lr, self.l2, self.batch_size]),
+                 source=np.array(self.source or ""), position=np.array(self.position))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=True)
+        dim, alpha, lr, l2, batch_size = data["config"]
+        model = cls(int(dim), float(alpha), float(lr), float(l2), int(batch_size))
+        model.names = data["names"].tolist()
+        model.ids = {name: i for i, name in enumerate(model.names)}
+        model.X, model.G, model.triplets = data["X"], data["G"], data["triplets"]
+        if "source" in data.files:
+            model.source = str(data["source"]) or None
+            model.position = int(data["position"])
+        return model
+
+def read_new_rows(model, kind, csv=None):
+    # Responses the model hasn't been trained on, and the position after them.
+    # The spool is read from the last response id onwards; a CSV export is
+    # append-only, so rows past the ones already seen are new.
+    if csv:
+        rows = pd.read_csv(csv, dtype=str).to_dict("records")
+        return rows[model.position:], len(rows)
+    new = spool.read_responses(kind, after_id=model.position)
+    return [row for _, row in new], new[-1][0] if new else model.position
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit brand or influencer embeddings from survey triplets.")
+    parser.add_argument("kind", choices=["brand", "influencer"])
+    parser.add_argument("--csv", help="a CSV export of the worksheet (default: read the local response spool)")
+    parser.add_argument("--model", help="model .npz to update incrementally and save back")
+    parser.add_argument("--dim", type=int, default=2)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--neighbours", type=int, default=10)
+    parser.add_argument("--out", help="CSV path for the nearest-neighbour table (default: neighbours_<kind>.csv)")
+    args = parser.parse_args()
+
+    source = "csv" if args.csv else "spool"
+    if args.model and os.path.exists(args.model):
+        model = TripletEmbedding.load(args.model)
+        if model.source != source:
+            parser.error(f"{args.model} was trained from {model.source or 'an unknown source'}, not the {source}; "
+                         "refit it with a new --model path")
+        rows, model.position = read_new_rows(model, args.kind, args.csv)
+        loss = model.partial_fit(rows, epochs=max(1, args.epochs // 10)) if rows else float("nan")
+    else:
+        model = TripletEmbedding(dim=args.dim)
+        model.source = source
+        rows, model.position = read_new_rows(model, args.kind, args.csv)
+        loss = model.fit(rows, epochs=args.epochs)
+    print(f"{len(model.names)} items, {len(model.triplets)} triplets, loss {loss:.4f}, "
+          f"{model.accuracy():.1%} of triplets satisfied")
+
+    if args.model:
+        model.save(args.model)
+    out = args.out or f"neighbours_{args.kind}.csv"
+    model.neighbours(args.neighbours).to_csv(out, index=False)
+    print(f"Wrote {out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,254 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import random
+from functools import lru_cache
+import asset_check
+import metrics
+import question_bank
+import snapshot
+import thumbnails
+from utils import preload_images_html
 
 CLOUDFRONT_PREFIX = "https://d2uc42tkny8gik.cloudfront.net/instagram/post_images/"
+POSTS_CSV = "resampled_posts_with_captions.csv"
+HTML_CACHE_SIZE = 2048
+POSTS_PER_INFLUENCER = 3
 
-@st.cache_data
-def load_influencer_data():
-    df = pd.read_csv("resampled_posts_with_captions.csv")
+# The survey only needs these columns; everything else in the scrape (bio,
+# contact details, profile pic, ...) is dropped at load time.
+POST_COLUMNS = ["influencer_name", "Category", "Followers", "Image_file_name", "caption"]
+CAPTION_LENGTH = 250
+
+def escape_html(s):
+    for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#x27;")):
+        s = s.str.replace(char, entity, regex=False)
+    return s
+
+def clean_posts(df):
+    # Row-local cleanup only, so it can run chunk by chunk (see posts_ingest).
+    df = df[POST_COLUMNS].copy()
     df['Followers'] = pd.to_numeric(df['Followers'], errors='coerce')
     df.dropna(subset=['influencer_name', 'Category', 'Followers', 'caption'], inplace=True)
+    df["Followers"] = df["Followers"].astype("int64")
     df["Image_file_name"] = df["Image_file_name"].str.strip("'").str.strip('"')
+    df["caption"] = escape_html(df["caption"].str.slice(0, CAPTION_LENGTH))
+    return df
+
+def compact_posts(df):
+    return pd.DataFrame({
+        "influencer_name": df["influencer_name"].astype("category"),
+        "Category": df["Category"].astype("category"),
+        "Followers": df["Followers"].astype("int32"),
+        "Image_file_name": df["Image_file_name"].astype("string[pyarrow]"),
+        "caption": df["caption"].astype("string[pyarrow]"),
+    })
+
+@st.cache_resource
+@metrics.timed("load_influencer_data")
+def load_influencer_data():
+    df = read_posts()
+    blocklist = asset_check.load_blocklist()
+    if blocklist:
+        df = df[~(CLOUDFRONT_PREFIX + df["Image_file_name"].astype(str)).isin(blocklist)]
+    df = compact_posts(df)
+
+    # Group each influencer's posts into one contiguous row range so lookups
+    # are a dict hit plus an iloc slice instead of a full-column scan.
+    df = df.sort_values("influencer_name", kind="stable").reset_index(drop=True)
+    df["influencer_name"] = df["influencer_name"].cat.remove_unused_categories()
+    codes = df["influencer_name"].cat.codes.to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    stops = np.r_[starts[1:], len(codes)]
+    influencer_names = df["influencer_name"].cat.categories.to_numpy(dtype=object)
+    followers = df["Followers"].to_numpy()[starts]
+    categories = df["Category"].to_numpy(dtype=object)[starts]
+    influencer_index = {
+        name: (int(start), int(stop), int(f), cat)
+        for name, start, stop, f, cat in zip(influencer_names, starts, stops, followers, categories)
+    }
+    category_index = build_category_index(categories)
+    return df, influencer_index, influencer_names, category_index
+
+def read_posts():
+    # Prefer the cleaned, deduplicated table written by posts_ingest.py, from
+    # whichever scrape it was given; fall back to cleaning the sample CSV.
+    df = snapshot.load(name="posts")
+    if df is None:
+        if "posts" in snapshot.read_manifest():
+            print("Posts snapshot is stale or its source is missing, reading the sample CSV")
+        df = clean_posts(pd.read_csv(POSTS_CSV, usecols=POST_COLUMNS))
+        df = df.drop_duplicates(subset=["influencer_name", "Image_file_name"])
     return df
 
-df = load_influencer_data()
+def build_category_index(categories):
+    # CSR layout over influencer ids (positions in influencer_names): the
+    # members of category c are members[offsets[c]:offsets[c] + counts[c]].
+    codes, labels = pd.factorize(categories, sort=True)
+    members = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(labels))
+    offsets = np.r_[0, np.cumsum(counts)[:-1]]
+    return {"categories": labels, "offsets": offsets, "counts": counts, "members": members}
+
+def memory_report(frame=None):
+    frame = load_influencer_data()[0] if frame is None else frame
+    usage = frame.memory_usage(deep=True, index=False)
+    return pd.DataFrame({"dtype": frame.dtypes.astype(str), "bytes": usage})
 
 def get_post_display(row):
-    image_url = f"{CLOUDFRONT_PREFIX}{row['Image_file_name']}"
+    image_url = thumbnails.thumbnail_url(f"{CLOUDFRONT_PREFIX}{row['Image_file_name']}")
     caption = row["caption"]
     return image_url, caption
 
-def get_influencer_info(name):
-    rows = df[df["influencer_name"] == name]
-    if rows.empty:
+def get_influencer_info(name, post_ids=None):
+    df, influencer_index, _, _ = load_influencer_data()
+    entry = influencer_index.get(name)
+    if entry is None:
         return None
+    start, stop, followers, category = entry
+    if post_ids is None:
+        post_ids = random.sample(range(start, stop), min(POSTS_PER_INFLUENCER, stop - start))
     return {
         "name": name,
-        "followers": int(rows.iloc[0]["Followers"]),
-        "category": rows.iloc[0]["Category"],
-        "posts": rows.sample(n=min(3, len(rows)))
+        "followers": followers,
+        "category": category,
+        "posts": df.iloc[[p for p in post_ids if p >= 0]]
     }
 
-def generate_questions():
-    categories = df['Category'].unique()
-    questions = []
-    for _ in range(20):
-        cat = random.choice(categories)
-        same_cat = df[df['Category'] == cat]['influencer_name'].unique()
-        if len(same_cat) < 2: continue
-        ref, a = random.sample(list(same_cat), 2)
-        b = random.choice(df['influencer_name'].unique())
-        while b in [ref, a]:
-            b = random.choice(df['influencer_name'].unique())
-        questions.append((ref, a, b))
-    for _ in range(10):
-        chosen_cats = random.sample(list(categories), 3)
-        selected = []
-        for cat in chosen_cats:
-            candidates = df[df['Category'] == cat]['influencer_name'].unique()
-            if len(candidates) == 0: break
-            selected.append(random.choice(candidates))
-        if len(selected) == 3:
-            questions.append(tuple(selected))
-    return questions
+def draw_same_category_triplets(n, rng):
+    _, _, influencer_names, category_index = load_influencer_data()
+    offsets, counts, members = category_index["offsets"], category_index["counts"], category_index["members"]
+    cats = rng.choice(np.flatnonzero(counts >= 2), n)
+
+    # Reference and "a" are two distinct members of the category; "b" is any
+    # other influencer. Each later draw comes from a range shrunk by the ids
+    # already taken and is shifted past them, so there is no retry loop.
+    i = rng.integers(counts[cats])
+    j = rng.integers(counts[cats] - 1)
+    j += j >= i
+    ref = members[offsets[cats] + i]
+    a = members[offsets[cats] + j]
+    b = rng.integers(len(influencer_names) - 2, size=n)
+    b += b >= np.minimum(ref, a)
+    b += b >= np.maximum(ref, a)
+    return np.column_stack([ref, a, b])
+
+def draw_mixed_category_triplets(n, rng):
+    _, _, influencer_names, category_index = load_influencer_data()
+    offsets, counts, members = category_index["offsets"], category_index["counts"], category_index["members"]
+    chosen = np.argsort(rng.random((n, len(counts))), axis=1)[:, :3]
+    return members[offsets[chosen] + rng.integers(counts[chosen])]
+
+@metrics.timed("build_influencer_bank")
+def build_influencer_bank(rng, n=6000):
+    n_mixed = n // 3
+    paired = question_bank.balanced_pick(draw_same_category_triplets(question_bank.POOL_FACTOR * (n - n_mixed), rng), n - n_mixed, rng)
+    mixed = question_bank.balanced_pick(draw_mixed_category_triplets(question_bank.POOL_FACTOR * n_mixed, rng), n_mixed, rng)
+    return question_bank.make_bank(paired, mixed)
+
+def load_influencer_bank():
+    return question_bank.load_bank("influencer", load_influencer_data()[2].tolist(), build_influencer_bank)
+
+@metrics.timed("generate_questions")
+def generate_questions(seed, adaptive=True):
+    bank = load_influencer_bank()
+    gains = question_bank.load_gains("influencer", bank, load_influencer_data()[2]) if adaptive else None
+    return question_bank.draw_session(bank, seed, gains)
+
+def get_influencer_question(question_id):
+    _, ref, a, b = load_influencer_bank()[question_id].tolist()
+    influencer_names = load_influencer_data()[2]
+    return influencer_names[ref], influencer_names[a], influencer_names[b]
+
+def select_posts(question_id):
+    # Row ids of the posts shown for each of the question's three influencers
+    # (-1 pads influencers with fewer posts). Seeded by the bank row, so a
+    # question always shows the same posts and their images stay cached in
+    # the browser.
+    _, influencer_index, _, _ = load_influencer_data()
+    rng = np.random.default_rng(question_id)
+    post_ids = np.full((3, POSTS_PER_INFLUENCER), -1, dtype=np.int32)
+    for slot, name in enumerate(get_influencer_question(question_id)):
+        if name in influencer_index:
+            start, stop = influencer_index[name][:2]
+            picks = start + rng.choice(stop - start, min(POSTS_PER_INFLUENCER, stop - start), replace=False)
+            post_ids[slot, :len(picks)] = picks
+    return post_ids
+
+def render_post(row, layout):
+    image_url, caption = get_post_display(row)
+    return f'''
+                <div style='{layout} display: flex; flex-direction: column; align-items: center;'>
+                    <img src="{image_url}" style="max-height: 160px; max-width: 100%; 
+                              border-radius: 6px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
+                    <p style="font-size: 12px; margin-top: 8px; text-align: center; 
+                              color: #444; overflow-wrap: break-word; line-height: 1.3;">{caption}</p>
+                </div>
+            '''
+
+@lru_cache(maxsize=HTML_CACHE_SIZE)
+@metrics.timed("render_influencer_question")
+def render_influencer_question(question_id, post_ids):
+    # Built once per bank row and shared across sessions and reruns; None if
+    # any of the three influencers is missing from the posts table.
+    infos = dict(zip(['reference', 'a', 'b'], map(get_influencer_info, get_influencer_question(question_id), post_ids)))
+    if not all(infos.values()):
+        return None
+    ref_info = infos['reference']
+
+    # Reference Block with shaded background (no category)
+    html = {"reference": f"""
+        <div style='text-align:center; margin-bottom: 16px; max-width: 85%; 
+                    margin-left:auto; margin-right:auto; padding: 16px;
+                    background-color: rgba(235, 235, 235, 0.7);
+                    border-radius: 8px;'>
+            <h4 style='margin-bottom:8px;'>Reference: @{ref_info['name']}</h4>
+            <p style='color:#555; margin-top:0;'>{ref_info['followers']:,} followers</p>
+        </div>
+    """, "prompt": f"<h4 style='text-align:center; margin-bottom:20px;'>Which influencer is more similar to @{ref_info['name']}?</h4>"}
+    html["reference_posts"] = [render_post(row, "height: 230px; justify-content: space-between;") for _, row in ref_info["posts"].iterrows()]
+
+    for key in ['a', 'b']:
+        info = infos[key]
+        # Option container (no category shown)
+        html[key] = f"""
+                <div style='padding: 16px; margin-bottom: 12px; 
+                            background-color: rgba(235, 235, 235, 0.7);
+                            border-radius: 8px;
+                            text-align: center;'>
+                    <div style='margin-bottom: 12px;'>
+                        <strong style='font-size: 16px;'>@{info['name']}</strong><br/>
+                        <p style='color:#555; margin-top:0; margin-bottom:0;'>{info['followers']:,} followers</p>
+                    </div>
+            """
+        html[f"{key}_posts"] = [render_post(row, "height: auto; justify-content: flex-start; margin-bottom: 12px;") for _, row in info["posts"].iterrows()]
+
+    html["preload"] = preload_images_html([
+        get_post_display(row)[0] for info in infos.values() for _, row in info["posts"].iterrows()
+    ])
+    names = {key: info['name'] for key, info in infos.items()}
+    return names, html
 
+def record_influencer_answer(i, names, selected, other):
+    st.session_state.influencer_responses.append({
+        "question": i + 1,
+        "reference": names["reference"],
+        "selected": names[selected],
+        "other": names[other]
+    })
+    question_bank.record_answer("influencer", (names["reference"], names["a"], names["b"]), selected == "a")
+    st.session_state.influencer_index += 1
+
+def question_key(i):
+    return int(st.session_state.influencer_questions[i]), tuple(map(tuple, st.session_state.influencer_posts[i].tolist()))
+
+@metrics.timed("run_influencer_survey")
 def run_influencer_survey():
     if "influencer_questions" not in st.session_state:
-        st.session_state.influencer_questions = generate_questions()
+        st.session_state.influencer_seed = question_bank.new_session_seed()
+        st.session_state.influencer_questions = generate_questions(
+            st.session_state.influencer_seed, adaptive=not question_bank.is_replay())
+        st.session_state.influencer_posts = np.stack([select_posts(int(q)) for q in st.session_state.influencer_questions])
         st.session_state.influencer_index = 0
         st.session_state.influencer_responses = []
 
@@ -63,14 +256,11 @@ def run_influencer_survey():
     if i >= len(st.session_state.influencer_questions):
         return True
 
-    q = st.session_state.influencer_questions[i]
-    ref_info = get_influencer_info(q[0])
-    a_info = get_influencer_info(q[1])
-    b_info = get_influencer_info(q[2])
-
-    if not all([ref_info, a_info, b_info]):
+    rendered = render_influencer_question(*question_key(i))
+    if rendered is None:
         st.session_state.influencer_index += 1
         st.rerun()
+    names, html = rendered
 
     # Centered title and progress indicator
     st.markdown(f"""
@@ -80,83 +270,45 @@ def run_influencer_survey():
     """, unsafe_allow_html=True)
     st.markdown("<hr style='margin-top:0; margin-bottom:20px;'>", unsafe_allow_html=True)
 
-    # Reference Block with shaded background (no category)
-    st.markdown(f"""
-        <div style='text-align:center; margin-bottom: 16px; max-width: 85%; 
-                    margin-left:auto; margin-right:auto; padding: 16px;
-                    background-color: rgba(235, 235, 235, 0.7);
-                    border-radius: 8px;'>
-            <h4 style='margin-bottom:8px;'>Reference: @{ref_info['name']}</h4>
-            <p style='color:#555; margin-top:0;'>{ref_info['followers']:,} followers</p>
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(html["reference"], unsafe_allow_html=True)
 
     # Reference images
     ref_cols = st.columns(3)
-    for idx, (_, row) in enumerate(ref_info["posts"].iterrows()):
+    for idx, post_html in enumerate(html["reference_posts"]):
         with ref_cols[idx]:
-            image_url, caption = get_post_display(row)
-            st.markdown(f'''
-                <div style='height: 230px; display: flex; flex-direction: column; 
-                            align-items: center; justify-content: space-between;'>
-                    <img src="{image_url}" style="max-height: 160px; max-width: 100%; 
-                              border-radius: 6px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
-                    <p style="font-size: 12px; margin-top: 8px; text-align: center; 
-                              color: #444; overflow-wrap: break-word; line-height: 1.3;">{caption[:250]}</p>
-                </div>
-            ''', unsafe_allow_html=True)
+            st.markdown(post_html, unsafe_allow_html=True)
 
     st.markdown("<hr style='margin:20px 0;'>", unsafe_allow_html=True)
-    st.markdown(f"<h4 style='text-align:center; margin-bottom:20px;'>Which influencer is more similar to @{ref_info['name']}?</h4>", unsafe_allow_html=True)
+    st.markdown(html["prompt"], unsafe_allow_html=True)
 
     # Comparison options
     col1, col2 = st.columns(2)
-    for col, key, info in zip([col1, col2], ['a', 'b'], [a_info, b_info]):
+    for col, key, other in zip([col1, col2], ['a', 'b'], ['b', 'a']):
         with col:
-            # Option container (no category shown)
-            st.markdown(f"""
-                <div style='padding: 16px; margin-bottom: 12px; 
-                            background-color: rgba(235, 235, 235, 0.7);
-                            border-radius: 8px;
-                            text-align: center;'>
-                    <div style='margin-bottom: 12px;'>
-                        <strong style='font-size: 16px;'>@{info['name']}</strong><br/>
-                        <p style='color:#555; margin-top:0; margin-bottom:0;'>{info['followers']:,} followers</p>
-                    </div>
-            """, unsafe_allow_html=True)
+            st.markdown(html[key], unsafe_allow_html=True)
 
             # Images grid
             cols = st.columns(3)
-            for idx, (_, row) in enumerate(info["posts"].iterrows()):
+            for idx, post_html in enumerate(html[f"{key}_posts"]):
                 with cols[idx]:
-                    image_url, caption = get_post_display(row)
-                    st.markdown(f'''
-                        <div style='height: auto; display: flex; flex-direction: column; 
-                                    align-items: center; justify-content: flex-start;
-                                    margin-bottom: 12px;'>
-                            <img src="{image_url}" style="max-height: 160px; max-width: 100%; 
-                                      border-radius: 6px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);" />
-                            <p style="font-size: 12px; margin-top: 8px; text-align: center; 
-                                      color: #444; overflow-wrap: break-word; line-height: 1.3;">{caption[:250]}</p>
-                        </div>
-                    ''', unsafe_allow_html=True)
+                    st.markdown(post_html, unsafe_allow_html=True)
 
             st.markdown("</div>", unsafe_allow_html=True)
             
-            # Centered selection button
+            # Centered selection button; the answer is recorded in the on_click
+            # callback, before the rerun that shows the next question.
             st.markdown("<div style='text-align:center;'>", unsafe_allow_html=True)
-            if st.button(f"Select @{info['name']}", 
-                        key=f"{key}_{i}",
-                        use_container_width=True,
-                        type="secondary"):
-                st.session_state.influencer_responses.append({
-                    "question": i + 1,
-                    "reference": ref_info["name"],
-                    "selected": info["name"],
-                    "other": a_info["name"] if key == "b" else b_info["name"]
-                })
-                st.session_state.influencer_index += 1
-                st.rerun()
+            st.button(f"Select @{names[key]}", 
+                      key=f"{key}_{i}",
+                      use_container_width=True,
+                      type="secondary",
+                      on_click=record_influencer_answer,
+                      args=(i, names, key, other))
             st.markdown("</div>", unsafe_allow_html=True)
 
+    if i + 1 < len(st.session_state.influencer_questions):
+        upcoming = render_influencer_question(*question_key(i + 1))
+        if upcoming is not None:
+            st.markdown(upcoming[1]["preload"], unsafe_allow_html=True)
+
     return False
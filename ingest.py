@@ -1,26 +1,87 @@
+import hashlib
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import metrics
 
-aws_access_key = st.secrets["aws"]["aws_access_key"]
-aws_secret_key = st.secrets["aws"]["aws_secret_key"]
+S3_CACHE_DIR = ".s3_cache"
+MAX_WORKERS = 16
 
-def s3_fetch_file(s3_key, bucket="grafluence"):
-    s3_client = boto3.client(
-        "s3",
-        region_name="us-east-1",  # ✅ or whatever region your bucket is in
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key
-    )
+_s3_client = None
+_s3_client_lock = threading.Lock()
 
+def get_s3_client():
+    # boto3 clients are thread-safe, so one pooled client serves every fetch
+    # in the process instead of building a new one per call.
+    global _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client(
+                "s3",
+                region_name="us-east-1",  # ✅ or whatever region your bucket is in
+                aws_access_key_id=st.secrets["aws"]["aws_access_key"],
+                aws_secret_access_key=st.secrets["aws"]["aws_secret_key"],
+                config=Config(max_pool_connections=MAX_WORKERS, retries={"max_attempts": 5, "mode": "adaptive"})
+            )
+    return _s3_client
+
+def _cache_path(bucket, s3_key):
+    digest = hashlib.sha1(f"{bucket}/{s3_key}".encode()).hexdigest()
+    return os.path.join(S3_CACHE_DIR, digest[:2], f"{digest}.json")
+
+def _read_cache(path):
     try:
-        obj = s3_client.get_object(Bucket=bucket, Key=s3_key)
-        body = obj["Body"].read().decode("utf-8")
-        return json.loads(body)
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_cache(path, etag, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"etag": etag, "body": body}, f)
+    os.replace(tmp, path)
+
+@metrics.timed("s3_fetch_file")
+def s3_fetch_file(s3_key, bucket="grafluence", client=None, revalidate=True):
+    # Cached objects are revalidated with a conditional GET on their ETag, so
+    # an unchanged object costs a bodyless 304. revalidate=False trusts the
+    # cache outright, which suits immutable keys like per-post metadata.
+    path = _cache_path(bucket, s3_key)
+    cached = _read_cache(path)
+    if cached is not None and not revalidate:
+        return cached["body"]
+
+    try:
+        client = client or get_s3_client()
+        conditional = {"IfNoneMatch": cached["etag"]} if cached else {}
+        obj = client.get_object(Bucket=bucket, Key=s3_key, **conditional)
+        body = json.load(obj["Body"])
+        _write_cache(path, obj["ETag"], body)
+        return body
+    except ClientError as e:
+        if cached is not None and e.response["Error"]["Code"] in ("304", "NotModified"):
+            return cached["body"]
+        print(f"Error fetching {s3_key}: {e}")
+        return {}
     except Exception as e:
         print(f"Error fetching {s3_key}: {e}")
         return {}
 
+@metrics.timed("s3_fetch_many")
+def fetch_many(keys, bucket="grafluence", client=None, revalidate=True, max_workers=MAX_WORKERS):
+    keys = list(dict.fromkeys(keys))
+    client = client or get_s3_client()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        bodies = pool.map(lambda key: s3_fetch_file(key, bucket, client, revalidate), keys)
+        return dict(zip(keys, bodies))
+
 # def generate_signed_url(s3_key, bucket="grafluence", expires_in=3600):
 #     s3_client = boto3.client(
 #         "s3",
@@ -0,0 +1,122 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# Opt-in timing for the hot paths. With SURVEY_METRICS unset, timed() returns
+# the function unchanged and timer() a shared no-op context manager, so the
+# instrumentation costs nothing. When enabled, each timing goes into an
+# in-process histogram (shown on the ?admin=metrics page) and a rolling JSONL
+# log, tagged with the session's phase.
+METRICS_ENABLED = os.environ.get("SURVEY_METRICS", "") not in ("", "0")
+METRICS_LOG = os.environ.get("SURVEY_METRICS_LOG", "metrics.jsonl")
+MAX_LOG_BYTES = 10 * 1024 * 1024
+FLUSH_EVERY = 100
+
+# Histogram bucket upper bounds in seconds: 10us doubling up to ~80s.
+BUCKETS = [1e-5 * 2 ** k for k in range(24)]
+
+_lock = threading.Lock()
+_histograms = {}
+_pending = []
+
+def current_phase():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    return ctx.session_state["phase"] if "phase" in ctx.session_state else None
+
+def record(name, seconds, phase=None):
+    key = (name, phase)
+    with _lock:
+        h = _histograms.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)})
+        h["count"] += 1
+        h["total"] += seconds
+        h["max"] = max(h["max"], seconds)
+        h["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+        _pending.append({"ts": time.time(), "pid": os.getpid(), "name": name, "phase": phase, "ms": round(seconds * 1000, 3)})
+        if len(_pending) >= FLUSH_EVERY:
+            flush()
+
+def flush():
+    # Called with _lock held (or at exit). Rotates the log to .1 once it
+    # passes MAX_LOG_BYTES, keeping one old file.
+    global _pending
+    if not _pending:
+        return
+    records, _pending = _pending, []
+    try:
+        if os.path.exists(METRICS_LOG) and os.path.getsize(METRICS_LOG) > MAX_LOG_BYTES:
+            os.replace(METRICS_LOG, f"{METRICS_LOG}.1")
+        with open(METRICS_LOG, "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+    except OSError as e:
+        print(f"Failed to write metrics log {METRICS_LOG}: {e}")
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, current_phase())
+        return False
+
+_NULL_TIMER = nullcontext()
+
+def timer(name):
+    return _Timer(name) if METRICS_ENABLED else _NULL_TIMER
+
+def timed(name=None):
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def percentile(buckets, count, q):
+    target = q * count
+    seen = 0
+    for bound, n in zip(BUCKETS + [float("inf")], buckets):
+        seen += n
+        if seen >= target:
+            return bound
+    return float("inf")
+
+def summary():
+    with _lock:
+        snapshot = {key: dict(h, buckets=list(h["buckets"])) for key, h in _histograms.items()}
+    return [
+        {
+            "name": name,
+            "phase": phase or "",
+            "count": h["count"],
+            "mean_ms": h["total"] / h["count"] * 1000,
+            "p50_ms": percentile(h["buckets"], h["count"], 0.5) * 1000,
+            "p90_ms": percentile(h["buckets"], h["count"], 0.9) * 1000,
+            "p99_ms": percentile(h["buckets"], h["count"], 0.99) * 1000,
+            "max_ms": h["max"] * 1000,
+            "total_s": h["total"],
+        }
+        for (name, phase), h in sorted(snapshot.items(), key=lambda item: -item[1]["total"])
+    ]
+
+if METRICS_ENABLED:
+    atexit.register(flush)
@@ -0,0 +1,117 @@
+import argparse
+import math
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import snapshot
+from influencer_logic import POSTS_CSV, POST_COLUMNS, clean_posts
+
+# Streams the posts CSV in chunks and writes the cleaned, deduplicated table
+# load_influencer_data reads (the "posts" snapshot entry), with each
+# influencer's posts contiguous. Peak memory is bounded by the chunk size
+# plus either one partition (keeping every post) or the per-influencer
+# reservoirs (downsampling), never by the size of the input.
+CHUNK_ROWS = 200_000
+PARTITION_BYTES = 512 * 1024 * 1024
+
+SCHEMA = pa.schema([
+    ("influencer_name", pa.string()),
+    ("Category", pa.string()),
+    ("Followers", pa.int64()),
+    ("Image_file_name", pa.string()),
+    ("caption", pa.string()),
+])
+
+def read_chunks(src, chunk_rows=CHUNK_ROWS):
+    for chunk in pd.read_csv(src, usecols=POST_COLUMNS, chunksize=chunk_rows):
+        yield clean_posts(chunk)
+
+def to_batch(df):
+    return pa.RecordBatch.from_pandas(df[POST_COLUMNS], schema=SCHEMA, preserve_index=False)
+
+def post_keys(df, seed):
+    # A seeded hash of (influencer, post) acts as the post's random priority:
+    # duplicates of a post always get the same key.
+    pair = df["influencer_name"].astype(str) + "/" + df["Image_file_name"].astype(str)
+    return pd.util.hash_array(pair.to_numpy(dtype=object), hash_key=f"{seed:016d}"[:16])
+
+def sample_per_influencer(chunks, per_influencer, seed):
+    # Reservoir sampling with random keys: keep the per_influencer smallest
+    # keys seen so far for each influencer, merging one chunk at a time. That
+    # is a uniform sample of each influencer's distinct posts, and it also
+    # dedupes exactly: a repeated post has the same key, so it either matches
+    # a reservoir entry or loses to the same posts it lost to before.
+    reservoir = pd.DataFrame(columns=POST_COLUMNS + ["key"])
+    for chunk in chunks:
+        chunk = chunk.assign(key=post_keys(chunk, seed))
+        merged = pd.concat([reservoir, chunk], ignore_index=True) if len(reservoir) else chunk
+        merged = merged.drop_duplicates(subset=["influencer_name", "key"])
+        merged = merged.sort_values(["influencer_name", "key"], kind="stable")
+        reservoir = merged[merged.groupby("influencer_name", sort=False).cumcount() < per_influencer]
+    yield reservoir.drop(columns="key")
+
+def partition_by_influencer(chunks, partitions, tmp_dir):
+    # Spread rows over partition files by influencer hash, so every
+    # influencer's posts (and duplicates) land in the same partition.
+    paths = [os.path.join(tmp_dir, f"part-{p}.arrow") for p in range(partitions)]
+    writers = [pa.ipc.new_stream(path, SCHEMA) for path in paths]
+    try:
+        for chunk in chunks:
+            part = pd.util.hash_array(chunk["influencer_name"].to_numpy(dtype=object)) % partitions
+            for p in np.unique(part):
+                writers[p].write_batch(to_batch(chunk[part == p]))
+    finally:
+        for writer in writers:
+            writer.close()
+    for path in paths:
+        with pa.memory_map(path) as source:
+            df = pa.ipc.open_stream(source).read_all().to_pandas()
+        os.remove(path)
+        yield df.drop_duplicates(subset=["influencer_name", "Image_file_name"])
+
+def ingest_posts(src=POSTS_CSV, snapshot_dir=snapshot.SNAPSHOT_DIR, per_influencer=None,
+                 chunk_rows=CHUNK_ROWS, partitions=None, seed=0):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    entry = snapshot.source_entry(src, per_influencer=per_influencer, seed=seed)
+    chunks = read_chunks(src, chunk_rows)
+    tmp_dir = tempfile.mkdtemp(dir=snapshot_dir)
+    if per_influencer:
+        groups = sample_per_influencer(chunks, per_influencer, seed)
+    else:
+        partitions = partitions or max(1, math.ceil(os.path.getsize(src) / PARTITION_BYTES))
+        groups = partition_by_influencer(chunks, partitions, tmp_dir)
+
+    rows = 0
+    out_path = os.path.join(snapshot_dir, "posts.arrow")
+    try:
+        with pa.OSFile(f"{out_path}.tmp", "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+            for df in groups:
+                df = df.sort_values("influencer_name", kind="stable")
+                writer.write_batch(to_batch(df))
+                rows += len(df)
+        os.replace(f"{out_path}.tmp", out_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    manifest = snapshot.read_manifest(snapshot_dir)
+    manifest["posts"] = entry
+    snapshot.write_manifest(manifest, snapshot_dir)
+    print(f"Snapshot posts: {rows} rows")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the posts CSV into the compact posts snapshot.")
+    parser.add_argument("src", nargs="?", default=POSTS_CSV)
+    parser.add_argument("--out", default=snapshot.SNAPSHOT_DIR)
+    parser.add_argument("--per-influencer", type=int, help="keep a uniform sample of at most N posts per influencer")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--partitions", type=int, help="partition count when keeping every post (default: from input size)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    ingest_posts(args.src, args.out, args.per_influencer, args.chunk_rows, args.partitions, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import numpy as np
+import streamlit as st
+import metrics
+import spool
+
+# A bank is an int32 array of rows (kind, reference, a, b), where the last
+# three are ids into the survey's sorted name list. Rows are sorted by kind so
+# a session can draw from each kind with plain index ranges on the memmap.
+BANK_DIR = "question_bank"
+PAIRED, MIXED = 0, 1
+SESSION_MIX = {PAIRED: 20, MIXED: 10}
+BANK_SEED = 0
+# Pool size per bank row: large enough that the distinct triplets left after
+# dropping repeats still fill the bank, or nearly exhaust a small item space.
+POOL_FACTOR = 16
+COUNTS_TTL = 5.0
+
+def balanced_pick(triplets, n, rng):
+    # Weighted sampling without replacement (Efraimidis-Spirakis) from an
+    # oversampled pool, weighting each triplet by the inverse frequency of its
+    # reference so every item is used as a reference about equally often. The
+    # pool is drawn with replacement, so repeats are dropped first, counting
+    # (ref, a, b) and (ref, b, a) as the same question.
+    key = np.column_stack([triplets[:, 0], triplets[:, 1:].min(1), triplets[:, 1:].max(1)])
+    triplets = triplets[np.sort(np.unique(key, axis=0, return_index=True)[1])]
+    n = min(n, len(triplets))
+    refs = triplets[:, 0]
+    weights = 1.0 / np.bincount(refs)[refs]
+    keys = np.log(rng.random(len(triplets))) / weights
+    return triplets[np.argpartition(-keys, n - 1)[:n]]
+
+def make_bank(paired, mixed):
+    rows = [np.column_stack([np.full(len(t), kind), t]) for kind, t in ((PAIRED, paired), (MIXED, mixed))]
+    return np.vstack(rows).astype(np.int32)
+
+def bank_paths(name, bank_dir=BANK_DIR):
+    return os.path.join(bank_dir, f"{name}.npy"), os.path.join(bank_dir, f"{name}_names.json")
+
+def save_bank(name, bank, names, bank_dir=BANK_DIR):
+    os.makedirs(bank_dir, exist_ok=True)
+    bank_path, names_path = bank_paths(name, bank_dir)
+    np.save(bank_path, bank)
+    with open(names_path, "w") as f:
+        json.dump(list(names), f)
+
+@st.cache_resource
+def load_bank(name, _names, _build):
+    # Prebuilt banks are memory-mapped so every session in the process shares
+    # the same pages. A bank built for a different name list would point at the
+    # wrong items, so in that case (or when none exists) build one in memory,
+    # from the same seed the CLI uses so every process gets the same bank.
+    bank_path, names_path = bank_paths(name)
+    if os.path.exists(bank_path) and os.path.exists(names_path):
+        with open(names_path) as f:
+            if json.load(f) == list(_names):
+                return np.load(bank_path, mmap_mode="r")
+        print(f"Question bank {bank_path} is stale, building in memory")
+    return _build(np.random.default_rng(BANK_SEED))
+
+def new_session_seed():
+    # ?seed=N replays a session exactly, for benchmarking and debugging.
+    seed = st.query_params.get("seed")
+    return int(seed) if seed is not None else random.getrandbits(32)
+
+def is_replay():
+    # Replayed sessions skip adaptive selection: the answer counts behind it
+    # change between runs, so the same seed would draw different questions.
+    return st.query_params.get("seed") is not None
+
+def expected_information(a_wins, b_wins):
+    # With a Beta(1 + a_wins, 1 + b_wins) posterior on how often "a" is picked
+    # for a row, the expected drop in its variance from one more answer. High
+    # for unseen and split rows, near zero once respondents clearly agree.
+    a, b = 1.0 + np.asarray(a_wins), 1.0 + np.asarray(b_wins)
+    var = lambda a, b: a * b / ((a + b) ** 2 * (a + b + 1))
+    p = a / (a + b)
+    return var(a, b) - p * var(a + 1, b) - (1 - p) * var(a, b + 1)
+
+@st.cache_resource(ttl=COUNTS_TTL, show_spinner=False)
+def load_gains(name, _bank, _names, path=spool.SPOOL_PATH):
+    # Answer counts live in the spool database, so every process on a host
+    # (all sharing its spool file) sees the same counts; replicas on separate
+    # machines each adapt to their own respondents only. Keyed by names rather
+    # than row ids, so they survive bank rebuilds. Read at most once per
+    # COUNTS_TTL per process, not per session.
+    with spool.connect(path) as conn:
+        counts = conn.execute("SELECT reference, a, b, a_wins, b_wins FROM answer_counts WHERE bank = ?", (name,)).fetchall()
+    conn.close()
+    ids = {n: i for i, n in enumerate(_names)}
+    # Banks built before repeats were dropped can hold a triplet several
+    # times; its counts apply to every copy.
+    rows = {}
+    for r, t in enumerate(np.asarray(_bank[:, 1:]).tolist()):
+        rows.setdefault(tuple(t), []).append(r)
+    wins = np.zeros((len(_bank), 2))
+    for reference, a, b, a_wins, b_wins in counts:
+        wins[rows.get((ids.get(reference), ids.get(a), ids.get(b)), [])] = a_wins, b_wins
+    return expected_information(wins[:, 0], wins[:, 1])
+
+def record_answer(name, triplet, chose_a, path=spool.SPOOL_PATH):
+    # Runs in the answer buttons' on_click. The counts only steer question
+    # selection, so a failed write is logged rather than breaking the survey.
+    try:
+        with metrics.timer("record_answer"), spool.connect(path) as conn:
+            conn.execute(
+                """INSERT INTO answer_counts (bank, reference, a, b, a_wins, b_wins) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bank, reference, a, b) DO UPDATE
+                SET a_wins = a_wins + excluded.a_wins, b_wins = b_wins + excluded.b_wins""",
+                (name, *triplet, int(chose_a), int(not chose_a)))
+        conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Failed to record answer counts in {path}: {e}")
+
+def draw_session(bank, seed, gains=None):
+    # Gumbel-top-k: each kind's rows are drawn without replacement with
+    # probability proportional to gains (uniformly without them), so sessions
+    # favour the questions we know least about while concurrent sessions
+    # still get different ones.
+    rng = np.random.default_rng(seed)
+    keys = rng.gumbel(size=len(bank))
+    if gains is not None:
+        keys += np.log(np.maximum(gains, 1e-12))
+    bounds = np.searchsorted(bank[:, 0], [PAIRED, MIXED, MIXED + 1])
+    return np.concatenate([
+        bounds[kind] + np.argsort(-keys[bounds[kind]:bounds[kind + 1]], kind="stable")[:count]
+        for kind, count in SESSION_MIX.items()
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-build the brand and influencer question banks.")
+    parser.add_argument("--brand", type=int, default=6000, help="number of brand questions (fewer if not that many distinct ones exist)")
+    parser.add_argument("--influencer", type=int, default=6000, help="number of influencer questions (fewer if not that many distinct ones exist)")
+    parser.add_argument("--seed", type=int, default=BANK_SEED)
+    parser.add_argument("--out", default=BANK_DIR)
+    args = parser.parse_args()
+
+    import brand_logic
+    import influencer_logic
+
+    brand_bank = brand_logic.build_brand_bank(np.random.default_rng(args.seed), args.brand)
+    save_bank("brand", brand_bank, brand_logic.load_brand_data()[0], args.out)
+    influencer_bank = influencer_logic.build_influencer_bank(np.random.default_rng(args.seed), args.influencer)
+    save_bank("influencer", influencer_bank, influencer_logic.load_influencer_data()[2].tolist(), args.out)
+    print(f"Wrote {len(brand_bank)} brand and {len(influencer_bank)} influencer questions to {args.out}/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Parsed copies of the raw data files, stored as Arrow IPC files that load by
+# memory-mapping instead of re-parsing the xlsx/csv on every cold start. Each
+# entry records the source's mtime, size and sha256; a stale entry is ignored
+# and the loaders fall back to parsing the source. The posts CSV is compiled
+# separately by posts_ingest.py, which streams it in chunks.
+SNAPSHOT_DIR = ".snapshot"
+SOURCES = [
+    ("grafluence_data.xlsx", "small_sample_prices"),
+    ("grafluence_data.xlsx", "brand_images_real"),
+]
+
+def entry_name(path, sheet_name=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}.{sheet_name}" if sheet_name else stem
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def is_fresh(entry, path):
+    if entry is None or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    # A touched but unchanged file (e.g. a fresh checkout) is still fresh;
+    # note its new mtime in the entry so the next check skips the hash.
+    if file_sha256(path) != entry["sha256"]:
+        return False
+    entry["mtime_ns"] = stat.st_mtime_ns
+    return True
+
+def fresh_entry(name, path=None, snapshot_dir=SNAPSHOT_DIR):
+    # is_fresh for loaders: after hashing a source once, record its new mtime
+    # in every entry built from it, so later loads (in any process) compare
+    # size and mtime only instead of re-reading the whole file. Without a
+    # path, the entry is checked against the source it was built from.
+    manifest = read_manifest(snapshot_dir)
+    entry = manifest.get(name)
+    mtime_ns = entry and entry["mtime_ns"]
+    if entry is None or not is_fresh(entry, path or entry["source"]):
+        return None
+    if entry["mtime_ns"] != mtime_ns:
+        for other in manifest.values():
+            if other["source"] == entry["source"] and other["sha256"] == entry["sha256"]:
+                other["mtime_ns"] = entry["mtime_ns"]
+        write_manifest(manifest, snapshot_dir)
+    return entry
+
+def source_entry(path, **extra):
+    stat = os.stat(path)
+    return {"source": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": file_sha256(path), **extra}
+
+def write_manifest(manifest, snapshot_dir=SNAPSHOT_DIR):
+    # Loaders read the manifest while others may be updating it, so replace
+    # it atomically rather than truncating it in place.
+    path = os.path.join(snapshot_dir, "manifest.json")
+    with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+def write_table(df, name, snapshot_dir=SNAPSHOT_DIR):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = os.path.join(snapshot_dir, f"{name}.arrow")
+    with pa.OSFile(f"{path}.{os.getpid()}.tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+def arrow_strings(arrow_type):
+    # Strings stay in the memory-mapped Arrow buffers rather than becoming one
+    # Python object per value; NaN for missing, like pandas' default str dtype.
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    return None
+
+def read_table(name, snapshot_dir=SNAPSHOT_DIR, columns=None):
+    with pa.memory_map(os.path.join(snapshot_dir, f"{name}.arrow")) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+def load(path=None, sheet_name=None, snapshot_dir=SNAPSHOT_DIR, columns=None, name=None):
+    name = name or entry_name(path, sheet_name)
+    if fresh_entry(name, path, snapshot_dir):
+        return read_table(name, snapshot_dir, columns).to_pandas(types_mapper=arrow_strings)
+    return None
+
+def read_excel(path, sheet_name):
+    df = load(path, sheet_name)
+    return df if df is not None else pd.read_excel(path, sheet_name=sheet_name)
+
+def build(sources=SOURCES, snapshot_dir=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = read_manifest(snapshot_dir)
+    for path, sheet_name in sources:
+        name = entry_name(path, sheet_name)
+        if is_fresh(manifest.get(name), path):
+            continue
+        entry = source_entry(path, sheet=sheet_name)
+        df = pd.read_excel(path, sheet_name=sheet_name)
+        # Excel columns can mix ints and strings, which Arrow won't store in
+        # one column; keep those as strings.
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].astype(str).where(df[col].notna())
+        write_table(df, name, snapshot_dir)
+        manifest[name] = entry
+        print(f"Snapshot {name}: {len(df)} rows")
+    write_manifest(manifest, snapshot_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the raw data files into an Arrow snapshot.")
+    parser.add_argument("--out", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+    build(snapshot_dir=args.out)
+
+    import posts_ingest
+    posts_ingest.ingest_posts(snapshot_dir=args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+import metrics
+
+# Survey responses are written to a local SQLite (WAL) spool as soon as a
+# respondent finishes, and a background SheetsFlusher copies them to Google
+# Sheets in batches. Rows are marked flushed rather than deleted, so the spool
+# doubles as a local log of everything collected by this replica.
+SPOOL_PATH = os.environ.get("SURVEY_SPOOL_PATH", "survey_spool.db")
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 5.0
+LEASE_SECONDS = 120.0
+
+_initialised = set()
+_init_lock = threading.Lock()
+
+def connect(path=SPOOL_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # WAL mode and the tables persist in the file, so they are set up once per
+    # spool per process rather than on every click.
+    key = os.path.abspath(path)
+    if key not in _initialised:
+        with _init_lock:
+            if key not in _initialised:
+                create_schema(conn)
+                _initialised.add(key)
+    return conn
+
+def create_schema(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        worksheet TEXT NOT NULL,
+        header TEXT NOT NULL,
+        row TEXT NOT NULL,
+        created REAL NOT NULL,
+        flushed INTEGER NOT NULL DEFAULT 0)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS flusher_lease (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        owner TEXT NOT NULL,
+        expires REAL NOT NULL)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS answer_counts (
+        bank TEXT NOT NULL,
+        reference TEXT NOT NULL,
+        a TEXT NOT NULL,
+        b TEXT NOT NULL,
+        a_wins INTEGER NOT NULL DEFAULT 0,
+        b_wins INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (bank, reference, a, b))""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS co_selections (
+        worksheet TEXT NOT NULL,
+        reference TEXT NOT NULL,
+        selected TEXT NOT NULL,
+        other TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (worksheet, reference, selected, other))""")
+    conn.commit()
+
+def count_selections(conn, rows, worksheet):
+    # Keeps co_selections (see aggregates.py) in step with the responses
+    # table: called inside the transaction that spools the rows.
+    conn.executemany(
+        """INSERT INTO co_selections (worksheet, reference, selected, other, count) VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (worksheet, reference, selected, other) DO UPDATE SET count = count + 1""",
+        [(worksheet, str(r["reference"]), str(r["selected"]), str(r["other"]))
+         for r in rows if {"reference", "selected", "other"} <= r.keys()])
+
+def enqueue(rows, worksheet, path=SPOOL_PATH):
+    if not rows:
+        return
+    header = list(rows[0])
+    now = time.time()
+    with connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO responses (worksheet, header, row, created) VALUES (?, ?, ?, ?)",
+            [(worksheet, json.dumps(header), json.dumps([str(r.get(h, "")) for h in header]), now) for r in rows])
+        count_selections(conn, rows, worksheet)
+    conn.close()
+
+def pending_count(path=SPOOL_PATH):
+    with connect(path) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM responses WHERE flushed = 0").fetchone()[0]
+    conn.close()
+    return count
+
+def read_responses(worksheet, path=SPOOL_PATH, after_id=0):
+    # Spooled rows for one worksheet as (id, row dict) pairs, oldest first;
+    # after_id lets a reader pick up only rows it hasn't seen yet.
+    with connect(path) as conn:
+        rows = conn.execute(
+            "SELECT id, header, row FROM responses WHERE worksheet = ? AND id > ? ORDER BY id",
+            (worksheet, after_id)).fetchall()
+    conn.close()
+    return [(row_id, dict(zip(json.loads(header), json.loads(row)))) for row_id, header, row in rows]
+
+class SheetsFlusher:
+    # open_spreadsheet is any zero-argument callable returning an object with
+    # gspread's Spreadsheet interface (worksheet, add_worksheet), so a local
+    # fake can stand in for the Sheets API.
+    def __init__(self, open_spreadsheet, path=SPOOL_PATH, batch_size=BATCH_SIZE,
+                 interval=FLUSH_INTERVAL, base_delay=1.0, max_delay=300.0):
+        self.open_spreadsheet = open_spreadsheet
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stop_event = threading.Event()
+        self.owner = uuid.uuid4().hex
+        self.thread = None
+        self._spreadsheet = None
+        self._worksheets = {}
+
+    def _worksheet(self, name, header):
+        # Cache each worksheet handle along with whether it has a header row,
+        # so the sheet is only inspected the first time we write to it.
+        if name not in self._worksheets:
+            import gspread
+
+            if self._spreadsheet is None:
+                self._spreadsheet = self.open_spreadsheet()
+            try:
+                sheet = self._spreadsheet.worksheet(name)
+            except gspread.exceptions.WorksheetNotFound:
+                sheet = self._spreadsheet.add_worksheet(title=name, rows="1000", cols="20")
+            self._worksheets[name] = [sheet, bool(sheet.row_values(1))]
+        entry = self._worksheets[name]
+        if not entry[1]:
+            entry[0].append_row(header)
+            entry[1] = True
+        return entry[0]
+
+    def _acquire_lease(self):
+        # Every process on a host shares the spool, so only the flusher holding
+        # the lease sends: two would both pick up the same pending rows, and
+        # both write a header to a new worksheet. The lease expires, so a
+        # crashed process only holds up the others for LEASE_SECONDS.
+        now = time.time()
+        conn = connect(self.path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            lease = conn.execute("SELECT owner, expires FROM flusher_lease WHERE id = 0").fetchone()
+            if lease is not None and lease[0] != self.owner and lease[1] > now:
+                conn.rollback()
+                return False
+            conn.execute("INSERT OR REPLACE INTO flusher_lease (id, owner, expires) VALUES (0, ?, ?)",
+                         (self.owner, now + LEASE_SECONDS))
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def _release_lease(self):
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM flusher_lease WHERE id = 0 AND owner = ?", (self.owner,))
+        conn.close()
+
+    @metrics.timed("sheets_flush")
+    def flush_once(self):
+        if not self._acquire_lease():
+            return 0
+        with connect(self.path) as conn:
+            pending = conn.execute(
+                "SELECT id, worksheet, header, row FROM responses WHERE flushed = 0 ORDER BY id LIMIT ?",
+                (self.batch_size,)).fetchall()
+        conn.close()
+
+        batches = {}
+        for row_id, worksheet, header, row in pending:
+            batches.setdefault(worksheet, (json.loads(header), [], []))
+            batches[worksheet][1].append(row_id)
+            batches[worksheet][2].append(json.loads(row))
+
+        # One append_rows call per worksheet per batch. A batch is only marked
+        # flushed after Sheets accepted it, so delivery is at-least-once.
+        for worksheet, (header, ids, rows) in batches.items():
+            self._worksheet(worksheet, header).append_rows(rows)
+            with connect(self.path) as conn:
+                conn.executemany("UPDATE responses SET flushed = 1 WHERE id = ?", [(i,) for i in ids])
+            conn.close()
+        return len(pending)
+
+    def run(self):
+        failures = 0
+        while not self.stop_event.is_set():
+            try:
+                sent = self.flush_once()
+                failures = 0
+            except Exception as e:
+                # Drop cached handles so the next attempt re-authorizes.
+                failures += 1
+                self._spreadsheet = None
+                self._worksheets.clear()
+                delay = min(self.max_delay, self.base_delay * 2 ** failures) * random.uniform(0.5, 1.0)
+                print(f"Sheets flush failed (attempt {failures}, retrying in {delay:.0f}s): {e}")
+                self.stop_event.wait(delay)
+                continue
+            if sent < self.batch_size:
+                self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="sheets-flusher", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout=30.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self._release_lease()
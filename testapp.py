@@ -1,10 +1,29 @@
 import streamlit as st
 st.set_page_config(page_title="Brand & Influencer Similarity Survey", layout="wide")
 
-import pandas as pd
-from brand_logic import run_brand_survey
-from influencer_logic import run_influencer_survey
-from utils import save_to_google_sheet
+import os
+import threading
+import metrics
+
+# The survey modules (and pandas, gspread, the data files behind them) are
+# imported by the phase that first needs them, so the title page renders
+# without waiting on any of it. warm_up_data loads them in the background
+# while the respondent reads the title page.
+@st.cache_resource
+def warm_up_data():
+    def load():
+        import brand_logic
+        import influencer_logic
+        import utils
+        # Rows left in the spool by an earlier run go out without waiting for
+        # the next respondent to finish.
+        utils.start_sheets_flusher()
+        brand_logic.load_brand_bank()
+        influencer_logic.load_influencer_bank()
+
+    thread = threading.Thread(target=load, name="data-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 # ----------------- CSS Styling ----------------- #
 st.markdown("""
@@ -108,7 +127,13 @@ def show_end_page():
             </p>
     """, unsafe_allow_html=True)
 
-    # Save responses to Google Sheets
+    # Save responses to Google Sheets (spooled locally, flushed in the
+    # background); only once per session, since the end page can rerun.
+    if st.session_state.get("responses_saved"):
+        return
+    import pandas as pd
+    from utils import save_to_google_sheet
+
     brand_responses = pd.DataFrame(st.session_state.get("brand_responses", []))
     influencer_responses = pd.DataFrame(st.session_state.get("influencer_responses", []))
     if not brand_responses.empty:
@@ -116,29 +141,59 @@ def show_end_page():
     if not influencer_responses.empty:
         save_to_google_sheet(influencer_responses, "influencer")
         st.success(f"Yay!")
+    st.session_state.responses_saved = True
+
+
+# Only the question area reruns when an answer is clicked; the full script
+# (CSS, phase routing) reruns just when the survey moves to the next phase.
+@st.fragment
+def run_survey_fragment(run_survey, next_phase):
+    if run_survey():
+        st.session_state.phase = next_phase
+        st.rerun()
 
+def show_metrics_page():
+    st.markdown("## Hot-path timings")
+    if not metrics.METRICS_ENABLED:
+        st.info("Metrics are disabled. Start the app with SURVEY_METRICS=1 to collect them.")
+        return
+    st.caption(f"Process {os.getpid()}; raw records in {metrics.METRICS_LOG}")
+    st.dataframe(metrics.summary())
+
+def show_responses_page():
+    import aggregates
+
+    st.markdown("## Responses")
+    st.caption("Counts of saved responses in this replica's spool, by reference.")
+    for worksheet in ["brand", "influencer"]:
+        st.markdown(f"### {worksheet.capitalize()}")
+        st.dataframe(aggregates.agreement_by_reference(worksheet))
 
 # ----------------- Main App Flow ----------------- #
+if st.query_params.get("admin") == "metrics":
+    show_metrics_page()
+    st.stop()
+if st.query_params.get("admin") == "responses":
+    show_responses_page()
+    st.stop()
+
 if "phase" not in st.session_state:
     st.session_state.phase = "title"
     st.session_state.brand_responses = []
     st.session_state.influencer_responses = []
 
 if st.session_state.phase == "title":
+    warm_up_data()
     show_title_page()
 elif st.session_state.phase == "brand_intro":
     show_brand_intro_page()
 elif st.session_state.phase == "brand_q":
-    done = run_brand_survey()
-    if done:
-        st.session_state.phase = "influencer_intro"
-        st.rerun()
+    from brand_logic import run_brand_survey
+    run_survey_fragment(run_brand_survey, "influencer_intro")
 elif st.session_state.phase == "influencer_intro":
     show_influencer_intro_page()
 elif st.session_state.phase == "influencer_q":
-    done = run_influencer_survey()
-    if done:
-        st.session_state.phase = "end"
-        st.rerun()
+    from influencer_logic import run_influencer_survey
+    run_survey_fragment(run_influencer_survey, "end")
 elif st.session_state.phase == "end":
     show_end_page()
\ No newline at end of file
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app is a set of top-level modules and the fakes live in bench/, so put
+# both on the path the way the bench scripts do.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
@@ -0,0 +1,48 @@
+import pytest
+import asset_check
+import fakes
+
+@pytest.mark.parametrize("status, size, broken", [
+    (200, 1024, False),
+    (206, 1024, False),
+    (200, None, False),
+    (200, 0, True),
+    (403, 0, True),
+    (404, 0, True),
+    (408, 0, False),
+    (429, 0, False),
+    (503, 0, False),
+    (0, None, False),
+])
+def test_is_broken(status, size, broken):
+    assert asset_check.is_broken({"status": status, "bytes": size}) is broken
+
+@pytest.fixture
+def server():
+    server = fakes.AssetServer({
+        "/ok.jpg": (200, 2048),
+        "/empty.jpg": (200, 0),
+        "/gone.jpg": (403, 0),
+        "/nohead/ok.jpg": (200, 555),
+        "/down.jpg": (503, 0),
+    })
+    yield server
+    server.close()
+
+def test_check_urls_against_local_server(server):
+    urls = [server.url + p for p in ["/ok.jpg", "/empty.jpg", "/gone.jpg", "/nohead/ok.jpg", "/down.jpg", "/missing.jpg"]]
+    results, checked = asset_check.check_urls(urls, {})
+    assert checked == 6
+    assert results[server.url + "/ok.jpg"]["bytes"] == 2048
+    # HEAD is refused there, so the size comes from a ranged GET.
+    assert results[server.url + "/nohead/ok.jpg"]["bytes"] == 555
+    assert sorted(u[len(server.url):] for u in urls if asset_check.is_broken(results[u])) == \
+        ["/empty.jpg", "/gone.jpg", "/missing.jpg"]
+
+def test_only_transient_results_are_rechecked(server):
+    urls = [server.url + "/ok.jpg", server.url + "/down.jpg"]
+    results, _ = asset_check.check_urls(urls, {})
+    requests = server.requests
+    results, checked = asset_check.check_urls(urls, results)
+    assert checked == 1
+    assert server.requests - requests == asset_check.RETRIES + 1
@@ -0,0 +1,33 @@
+import pytest
+import fakes
+import ingest
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "S3_CACHE_DIR", str(tmp_path / "s3_cache"))
+
+def test_revalidation_reuses_the_cached_body():
+    client = fakes.FakeS3Client(fakes.post_metadata_objects(["a.json", "b.json"]))
+    first = ingest.fetch_many(["a.json", "b.json", "a.json"], client=client)
+    assert client.calls == 2
+    assert first["a.json"]["key"] == "a.json"
+
+    # Unchanged objects come back as 304 and are served from the cache.
+    assert ingest.fetch_many(["a.json", "b.json"], client=client) == first
+    assert client.calls == 4
+
+def test_changed_object_is_refetched():
+    client = fakes.FakeS3Client(fakes.post_metadata_objects(["a.json"]))
+    ingest.s3_fetch_file("a.json", client=client)
+    client.put_object("grafluence", "a.json", b'{"key": "a.json", "likes": 99}')
+    assert ingest.s3_fetch_file("a.json", client=client)["likes"] == 99
+
+def test_no_revalidation_skips_the_network():
+    client = fakes.FakeS3Client(fakes.post_metadata_objects(["a.json"]))
+    ingest.s3_fetch_file("a.json", client=client)
+    assert ingest.s3_fetch_file("a.json", client=client, revalidate=False)["key"] == "a.json"
+    assert client.calls == 1
+
+def test_missing_object_returns_empty():
+    client = fakes.FakeS3Client()
+    assert ingest.s3_fetch_file("missing.json", client=client) == {}
@@ -0,0 +1,30 @@
+import os
+import pandas as pd
+import influencer_logic
+import posts_ingest
+
+def write_scrape(path, influencers, posts):
+    pd.DataFrame([{"influencer_name": f"inf{i}", "Category": "Fashion", "Followers": 1000 + i,
+                   "Image_file_name": f"'{i}_{p}.jpg'", "caption": f"post {p} <3"}
+                  for i in range(influencers) for p in range(posts)]).to_csv(path, index=False)
+
+def test_app_reads_the_ingested_scrape_not_the_sample(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_scrape(influencer_logic.POSTS_CSV, 2, 2)
+    write_scrape("full_scrape.csv", 60, 8)
+    assert posts_ingest.ingest_posts("full_scrape.csv", per_influencer=5) == 300
+    df = influencer_logic.read_posts()
+    assert len(df) == 300
+    assert df["caption"].iloc[0].endswith("&lt;3")
+    # Strings come straight from the snapshot's Arrow buffers.
+    assert df["caption"].dtype.storage == "pyarrow"
+
+def test_changed_scrape_falls_back_to_the_sample(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_scrape(influencer_logic.POSTS_CSV, 2, 2)
+    write_scrape("full_scrape.csv", 60, 8)
+    posts_ingest.ingest_posts("full_scrape.csv")
+    write_scrape("full_scrape.csv", 61, 8)
+    assert len(influencer_logic.read_posts()) == 4
+    os.remove("full_scrape.csv")
+    assert len(influencer_logic.read_posts()) == 4
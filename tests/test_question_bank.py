@@ -0,0 +1,30 @@
+import os
+import numpy as np
+import question_bank
+
+def test_balanced_pick_drops_repeated_questions():
+    # Two references, each with three distinct (a, b) questions, drawn with
+    # repeats and in both orders.
+    distinct = np.array([[0, 1, 2], [0, 1, 3], [0, 2, 3], [4, 1, 2], [4, 1, 3], [4, 2, 3]])
+    rng = np.random.default_rng(0)
+    pool = distinct[rng.integers(len(distinct), size=200)]
+    pool[::2, 1:] = pool[::2, :0:-1]
+    picked = question_bank.balanced_pick(pool, 6, rng)
+    assert len(picked) == 6
+    assert {(r, min(a, b), max(a, b)) for r, a, b in picked.tolist()} == set(map(tuple, distinct.tolist()))
+    assert len(question_bank.balanced_pick(pool, 10, rng)) == 6
+
+def test_counts_reach_every_copy_of_a_triplet(tmp_path):
+    path = str(tmp_path / "spool.db")
+    bank = np.array([[0, 0, 1, 2], [0, 0, 1, 2], [0, 1, 2, 3]], dtype=np.int32)
+    for _ in range(50):
+        question_bank.record_answer("brand", ("A", "B", "C"), True, path)
+    gains = question_bank.load_gains("brand", bank, ["A", "B", "C", "D"], path)
+    assert gains[0] == gains[1] < gains[2] / 100
+
+def test_failed_count_write_is_logged_not_raised(tmp_path, capsys):
+    path = str(tmp_path / "spool.db")
+    question_bank.record_answer("brand", ("A", "B", "C"), True, path)
+    os.remove(path)
+    question_bank.record_answer("brand", ("A", "B", "C"), True, path)
+    assert "Failed to record answer counts" in capsys.readouterr().out
@@ -0,0 +1,85 @@
+import threading
+import pytest
+import fakes
+import spool
+
+def rows(n, start=0):
+    return [{"question": q + 1, "reference": "A", "selected": "B", "other": "C"} for q in range(start, start + n)]
+
+class FlakySpreadsheet(fakes.FakeSpreadsheet):
+    # Fails the first `failures` append_rows calls, like a Sheets 5xx.
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def add_worksheet(self, title, rows, cols):
+        sheet = super().add_worksheet(title, rows, cols)
+        append_rows = sheet.append_rows
+
+        def flaky(values):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("Sheets unavailable")
+            append_rows(values)
+        sheet.append_rows = flaky
+        return sheet
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "spool.db")
+
+def test_rows_land_once_with_one_header(path):
+    spool.enqueue(rows(30), "brand", path)
+    spool.enqueue(rows(30), "influencer", path)
+    sheet = fakes.FakeSpreadsheet()
+    flusher = spool.SheetsFlusher(lambda: sheet, path=path)
+    assert flusher.flush_once() == 60
+    spool.enqueue(rows(30, 30), "brand", path)
+    assert flusher.flush_once() == 30
+    assert flusher.flush_once() == 0
+
+    brand = sheet.worksheets["brand"].rows
+    assert brand[0] == ["question", "reference", "selected", "other"]
+    assert [r[0] for r in brand[1:]] == [str(q) for q in range(1, 61)]
+    assert len(sheet.worksheets["influencer"].rows) == 31
+    assert spool.pending_count(path) == 0
+
+def test_existing_header_is_not_rewritten(path):
+    sheet = fakes.FakeSpreadsheet()
+    sheet.add_worksheet("brand", 1000, 20).append_row(["question", "reference", "selected", "other"])
+    spool.enqueue(rows(5), "brand", path)
+    spool.SheetsFlusher(lambda: sheet, path=path).flush_once()
+    assert len(sheet.worksheets["brand"].rows) == 6
+
+def test_failed_batch_stays_pending_and_is_retried(path):
+    spool.enqueue(rows(10), "brand", path)
+    sheet = FlakySpreadsheet(failures=1)
+    flusher = spool.SheetsFlusher(lambda: sheet, path=path)
+    with pytest.raises(RuntimeError):
+        flusher.flush_once()
+    assert spool.pending_count(path) == 10
+    assert flusher.flush_once() == 10
+    assert len(sheet.worksheets["brand"].rows) == 11
+    assert spool.pending_count(path) == 0
+
+def test_two_flushers_on_one_spool_send_each_row_once(path):
+    spool.enqueue(rows(50), "brand", path)
+    sheet = fakes.FakeSpreadsheet(latency=0.02)
+    flushers = [spool.SheetsFlusher(lambda: sheet, path=path) for _ in range(2)]
+    threads = [threading.Thread(target=f.flush_once) for f in flushers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(sheet.worksheets["brand"].rows) == 51
+    assert spool.pending_count(path) == 0
+
+def test_lease_passes_on_after_stop(path):
+    sheet = fakes.FakeSpreadsheet()
+    first, second = (spool.SheetsFlusher(lambda: sheet, path=path) for _ in range(2))
+    spool.enqueue(rows(3), "brand", path)
+    assert first.flush_once() == 3
+    spool.enqueue(rows(3, 3), "brand", path)
+    assert second.flush_once() == 0
+    first.stop()
+    assert second.flush_once() == 3
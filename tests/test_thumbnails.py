@@ -0,0 +1,52 @@
+import os
+import pytest
+from PIL import Image
+import thumbnails
+
+@pytest.fixture
+def dirs(tmp_path):
+    sources = tmp_path / "images"
+    sources.mkdir()
+    for name, size in [("wide.jpg", (800, 400)), ("tall.png", (300, 900)), ("small.jpg", (60, 40))]:
+        Image.new("RGB", size, "red").save(sources / name)
+    return {"sources": sources, "static": str(tmp_path / "static"), "thumbs": str(tmp_path / "static" / "thumbs"),
+            "manifest": str(tmp_path / "thumbnails_manifest.json")}
+
+def build(dirs, size=320):
+    jobs = [(str(path), size) for path in sorted(dirs["sources"].iterdir())]
+    return thumbnails.build_thumbnails(jobs, dirs["thumbs"], dirs["manifest"], workers=2, static_dir=dirs["static"])
+
+def test_builds_then_skips_current_thumbnails(dirs):
+    manifest, todo, made, failed = build(dirs)
+    assert (todo, made, failed) == (3, 3, 0)
+    entry = manifest[str(dirs["sources"] / "wide.jpg")]
+    assert (entry["width"], entry["height"]) == (320, 160)
+    assert entry["url"] == "app/static/thumbs/" + os.path.relpath(entry["path"], dirs["thumbs"]).replace(os.sep, "/")
+    assert os.path.exists(entry["path"])
+    assert thumbnails.load_manifest(dirs["manifest"]) == manifest
+
+    _, todo, made, failed = build(dirs)
+    assert (todo, made, failed) == (0, 0, 0)
+
+def test_changed_source_is_rebuilt(dirs):
+    build(dirs)
+    Image.new("RGB", (400, 800), "blue").save(dirs["sources"] / "wide.jpg")
+    manifest, todo, made, failed = build(dirs)
+    assert (todo, made, failed) == (1, 1, 0)
+    assert manifest[str(dirs["sources"] / "wide.jpg")]["height"] == 320
+
+def test_missing_thumbnail_is_rebuilt(dirs):
+    manifest, _, _, _ = build(dirs)
+    os.remove(manifest[str(dirs["sources"] / "tall.png")]["path"])
+    _, todo, made, _ = build(dirs)
+    assert (todo, made) == (1, 1)
+
+def test_unreadable_source_fails_without_an_entry(dirs):
+    (dirs["sources"] / "broken.jpg").write_bytes(b"not an image")
+    manifest, todo, made, failed = build(dirs)
+    assert (todo, made, failed) == (4, 3, 1)
+    assert str(dirs["sources"] / "broken.jpg") not in manifest
+
+def test_thumb_dir_outside_static_is_rejected(dirs, tmp_path):
+    with pytest.raises(ValueError):
+        thumbnails.build_thumbnails([], str(tmp_path / "elsewhere"), dirs["manifest"], static_dir=dirs["static"])
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+# Offline pipeline that shrinks every survey image to a small WebP served by
+# Streamlit's static file server (static/ next to testapp.py, enabled in
+# .streamlit/config.toml), so the browser no longer downloads full-size
+# product and post images to show them at 80-160px. Fetch, decode, resize and
+# encode run in a process pool. The manifest maps each source (URL or local
+# path) to its thumbnail; re-runs skip sources whose thumbnail is current. It
+# holds local paths and source URLs, so it lives outside the public static/.
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+THUMB_DIR = os.path.join(STATIC_DIR, "thumbs")
+MANIFEST_PATH = "thumbnails_manifest.json"
+# Longest side in pixels: twice the largest size each image is shown at.
+SIZES = {"brand": 180, "post": 320}
+QUALITY = 75
+FETCH_TIMEOUT = 20
+SAVE_EVERY = 500
+
+@lru_cache(maxsize=None)
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def thumbnail_url(source):
+    entry = load_manifest().get(source)
+    return entry["url"] if entry else source
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=0)
+    os.replace(f"{path}.tmp", path)
+
+def thumb_path(source, thumb_dir=THUMB_DIR):
+    digest = hashlib.sha1(source.encode()).hexdigest()
+    return os.path.join(thumb_dir, digest[:2], f"{digest}.webp")
+
+def in_static(path, static_dir=STATIC_DIR):
+    static_dir = os.path.abspath(static_dir)
+    return os.path.commonpath([os.path.abspath(path), static_dir]) == static_dir
+
+def static_url(path, static_dir=STATIC_DIR):
+    return f"{STATIC_URL}/{os.path.relpath(path, static_dir).replace(os.sep, '/')}"
+
+def is_remote(source):
+    return source.startswith(("http://", "https://"))
+
+def local_stamp(source):
+    stat = os.stat(source)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def read_source(source, entry):
+    # Returns (bytes or None if unchanged, validators). Remote sources are
+    # revalidated with a conditional GET against the stored ETag / date.
+    if not is_remote(source):
+        with open(source, "rb") as f:
+            return f.read(), local_stamp(source)
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        with urllib.request.urlopen(urllib.request.Request(source, headers=headers), timeout=FETCH_TIMEOUT) as resp:
+            return resp.read(), {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, {}
+        raise
+
+def make_thumbnail(source, out_path, max_size, entry=None):
+    # Runs in a worker process. Returns (source, manifest entry or None if the
+    # thumbnail is still current, error message or None).
+    from PIL import Image, ImageOps
+
+    try:
+        data, validators = read_source(source, entry)
+        if data is None:
+            return source, None, None
+        img = Image.open(io.BytesIO(data))
+        # JPEG can decode straight at a reduced scale, far cheaper than
+        # decoding full size and resizing.
+        img.draft("RGB", (max_size, max_size))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp = f"{out_path}.{os.getpid()}.tmp"
+        img.save(tmp, "WEBP", quality=QUALITY, method=4)
+        os.replace(tmp, out_path)
+        return source, {
+            "path": out_path,
+            "width": img.width,
+            "height": img.height,
+            "bytes": os.path.getsize(out_path),
+            "source_bytes": len(data),
+            **validators,
+        }, None
+    except Exception as e:
+        return source, None, f"{type(e).__name__}: {e}"
+
+def is_current(source, entry, revalidate):
+    if entry is None or not os.path.exists(entry["path"]):
+        return False
+    if not is_remote(source):
+        stamp = local_stamp(source)
+        return entry.get("mtime_ns") == stamp["mtime_ns"] and entry.get("size") == stamp["size"]
+    return not revalidate
+
+def build_thumbnails(jobs, thumb_dir=THUMB_DIR, manifest_path=MANIFEST_PATH, workers=None, revalidate=False,
+                     static_dir=STATIC_DIR):
+    # jobs is an iterable of (source, max_size). Thumbnails outside static_dir
+    # would have no URL to serve them from.
+    if not in_static(thumb_dir, static_dir):
+        raise ValueError(f"{thumb_dir} is not inside {static_dir}")
+    os.makedirs(thumb_dir, exist_ok=True)
+    manifest = dict(load_manifest(manifest_path))
+    todo = {source: size for source, size in jobs if not is_current(source, manifest.get(source), revalidate)}
+    made = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(make_thumbnail, source, thumb_path(source, thumb_dir), size, manifest.get(source))
+                   for source, size in todo.items()]
+        for done, future in enumerate(as_completed(futures), 1):
+            source, entry, error = future.result()
+            if error:
+                failed += 1
+                print(f"Failed {source}: {error}")
+            elif entry:
+                manifest[source] = {**entry, "url": static_url(entry["path"], static_dir)}
+                made += 1
+            if done % SAVE_EVERY == 0:
+                save_manifest(manifest, manifest_path)
+    save_manifest(manifest, manifest_path)
+    load_manifest.cache_clear()
+    return manifest, len(todo), made, failed
+
+def survey_jobs():
+    # Every image the loaders can sample, minus blocklisted ones.
+    import asset_check
+    import brand_logic
+    import influencer_logic
+
+    blocklist = asset_check.load_blocklist()
+    brand_urls = brand_logic.read_brand_images()["Product image URL"].astype(str)
+    post_urls = influencer_logic.CLOUDFRONT_PREFIX + influencer_logic.read_posts()["Image_file_name"].astype(str)
+    return [(url, SIZES["brand"]) for url in dict.fromkeys(brand_urls) if url not in blocklist] + \
+           [(url, SIZES["post"]) for url in dict.fromkeys(post_urls) if url not in blocklist]
+
+def main():
+    parser = argparse.ArgumentParser(description="Build WebP thumbnails for the survey's images.")
+    parser.add_argument("--dir", help="thumbnail every image in a local directory instead of the survey's images")
+    parser.add_argument("--size", type=int, default=SIZES["post"], help="longest side for --dir images")
+    parser.add_argument("--out", default=THUMB_DIR, help=f"thumbnail directory, inside {STATIC_DIR}/")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="re-check remote sources that already have a thumbnail (conditional GET)")
+    args = parser.parse_args()
+    if not in_static(args.out):
+        parser.error(f"--out must be inside {STATIC_DIR}/, which is what Streamlit serves")
+
+    if args.dir:
+        jobs = [(os.path.join(args.dir, name), args.size) for name in sorted(os.listdir(args.dir))
+                if os.path.isfile(os.path.join(args.dir, name))]
+    else:
+        jobs = survey_jobs()
+    start = time.perf_counter()
+    manifest, todo, made, failed = build_thumbnails(jobs, args.out, args.manifest, args.workers, args.revalidate)
+    entries = [manifest[source] for source, _ in jobs if source in manifest]
+    print(f"{len(jobs)} sources: {len(jobs) - todo} already current, {made} built, {todo - made - failed} unchanged, "
+          f"{failed} failed in {time.perf_counter() - start:.1f}s")
+    if entries:
+        source_bytes = sum(e["source_bytes"] for e in entries)
+        thumb_bytes = sum(e["bytes"] for e in entries)
+        print(f"Thumbnails: {thumb_bytes / 2 ** 20:.1f} MB for {source_bytes / 2 ** 20:.1f} MB of sources")
+    print(f"Wrote {args.manifest}")
+
+if __name__ == "__main__":
+    main()